@@ -0,0 +1,118 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+import cache
+from uploads import file_hash
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def current_context(client, assistant_id: str, instructions_path: str = "instructions.txt") -> dict:
+    """Everything besides the question that decides the answer.
+
+    Assistant and vector store file listings come from the metadata cache, so
+    this normally costs no API calls.
+    """
+    assistant = cache.metadata.get_or_load(
+        "assistants", assistant_id, lambda: client.beta.assistants.retrieve(assistant_id)
+    )
+    vector_store_ids = []
+    file_search = assistant.tool_resources.file_search if assistant.tool_resources else None
+    if file_search and file_search.vector_store_ids:
+        vector_store_ids = file_search.vector_store_ids
+
+    file_ids = set()
+    for vector_store_id in vector_store_ids:
+        file_ids.update(vs_file.id for vs_file in cache.vector_store_files(client, vector_store_id))
+
+    try:
+        instructions_sha256 = file_hash(instructions_path)
+    except FileNotFoundError:
+        instructions_sha256 = None
+    return {
+        "instructions_sha256": instructions_sha256,
+        "model": assistant.model,
+        "file_ids": sorted(file_ids),
+    }
+
+
+# # Answer Cache
+class AnswerCache:
+    """SQLite cache of answers with TTL and LRU eviction.
+
+    The key covers the normalized question and the full context, so changing
+    the instructions, the model or the vector store files makes old entries
+    unreachable; they then age out through the TTL and the LRU limit.
+    """
+
+    def __init__(
+        self,
+        path: str = ".answer_cache.sqlite3",
+        ttl: float = 7 * 24 * 3600,
+        max_entries: int = 1000,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, question TEXT, answer TEXT, "
+            "created_at REAL, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def key(question: str, context: dict) -> str:
+        payload = json.dumps([normalize_question(question), context], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, question: str, context: dict) -> str | None:
+        key = self.key(question, context)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT answer, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                if row is not None:
+                    self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, question: str, context: dict, answer: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                (self.key(question, context), question, answer, now, now),
+            )
+            self._db.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM answers WHERE key NOT IN "
+                "(SELECT key FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        self._db.close()
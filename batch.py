@@ -0,0 +1,175 @@
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import answers
+import metrics
+import runs
+from pagination import paginate
+from ratelimit import AdaptiveLimiter
+
+
+def read_questions(path: str):
+    """Yield {"id", "question"} dicts from a JSONL or CSV file.
+
+    JSONL lines may be objects with "question" (and optionally "id") or plain
+    strings; CSV files need a "question" column and may have an "id" column.
+    Questions without an ID get their line or row number.
+    """
+    with open(path, "r", newline="") as file:
+        if path.lower().endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(file), start=1):
+                yield {"id": row.get("id") or str(number), "question": row["question"]}
+            return
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            yield {"id": str(item.get("id", number)), "question": item["question"]}
+
+
+def answered_ids(results_path: str, retry_failed: bool = False) -> set[str]:
+    """IDs already recorded in the results file (completed ones only if retry_failed)."""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, "r") as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            if not retry_failed or result.get("status") == "completed":
+                done.add(result["id"])
+    return done
+
+
+def ask(
+    client,
+    assistant_id: str,
+    question: str,
+    timeout: float,
+    keep_thread: bool = False,
+    run_options: dict = None,
+) -> dict:
+    """Ask one question on its own fresh thread and wait for the answer."""
+    start = time.perf_counter()
+    run = client.beta.threads.create_and_run(
+        assistant_id=assistant_id,
+        thread={"messages": [{"role": "user", "content": question}]},
+        **(run_options or {}),
+    )
+    run = runs.wait_for_run(client, run, timeout)
+    answer = None
+    if run.status == "completed":
+        messages = paginate(
+            client.beta.threads.messages.list, thread_id=run.thread_id, run_id=run.id, order="asc"
+        )
+        answer = "\n".join(
+            content.text.value
+            for message in messages
+            if message.role == "assistant"
+            for content in message.content
+            if content.type == "text"
+        )
+    if not keep_thread:
+        try:
+            client.beta.threads.delete(run.thread_id)
+        except Exception:
+            pass
+    return {
+        "answer": answer,
+        "status": run.status,
+        "error": run.last_error.message if run.last_error else None,
+        "latency_s": round(time.perf_counter() - start, 3),
+        "usage": run.usage.model_dump() if run.usage else None,
+        "run_id": run.id,
+        "thread_id": run.thread_id,
+    }
+
+
+# # Batch Runner
+def run_batch(
+    client,
+    assistant_id: str,
+    questions_path: str,
+    results_path: str,
+    concurrency: int = 8,
+    timeout: float = 300.0,
+    retry_failed: bool = False,
+    answer_cache=None,
+    run_options: dict = None,
+) -> dict:
+    """Answer every question of the input file, at most `concurrency` at a time.
+
+    Each result is appended to the JSONL results file as soon as it is ready,
+    so a crashed batch resumes where it stopped: questions already recorded
+    there are not asked again.
+    """
+    done = answered_ids(results_path, retry_failed)
+    context = None
+    if answer_cache is not None:
+        try:
+            context = answers.current_context(client, assistant_id)
+        except Exception as e:
+            print(f"Answer cache skipped: {str(e)}")
+    lock = threading.Lock()
+    limiter = AdaptiveLimiter(concurrency)
+    counts = {"completed": 0, "failed": 0, "cached": 0, "skipped": 0, "total_tokens": 0}
+    start = time.perf_counter()
+
+    def answer(item):
+        cached = answer_cache.get(item["question"], context) if context is not None else None
+        if cached is not None:
+            result = {"answer": cached, "status": "completed", "cached": True, "latency_s": 0.0}
+        else:
+            try:
+                with limiter, metrics.span("batch question", id=item["id"]):
+                    result = ask(
+                        client, assistant_id, item["question"], timeout, run_options=run_options
+                    )
+            except Exception as e:
+                result = {"answer": None, "status": "error", "error": str(e)}
+            if context is not None and result["status"] == "completed":
+                answer_cache.put(item["question"], context, result["answer"])
+        record = {"id": item["id"], "question": item["question"], **result}
+        with lock:
+            with open(results_path, "a") as file:
+                file.write(json.dumps(record) + "\n")
+            key = "cached" if result.get("cached") else (
+                "completed" if result["status"] == "completed" else "failed"
+            )
+            counts[key] += 1
+            counts["total_tokens"] += (result.get("usage") or {}).get("total_tokens", 0)
+            finished = counts["completed"] + counts["failed"] + counts["cached"]
+            print(f"[{finished}] {item['id']}: {result['status']} ({result.get('latency_s', 0):.2f}s)")
+
+    def pending():
+        for item in read_questions(questions_path):
+            if item["id"] in done:
+                counts["skipped"] += 1
+                continue
+            # Mark as taken so duplicated IDs in the input are only asked once
+            done.add(item["id"])
+            yield item
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Bound the number of queued questions instead of reading the whole file up front
+        slots = threading.BoundedSemaphore(concurrency * 2)
+
+        def submit(item):
+            slots.acquire()
+            future = pool.submit(answer, item)
+            future.add_done_callback(lambda _: slots.release())
+
+        for item in pending():
+            submit(item)
+
+    counts["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return counts
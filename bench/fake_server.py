@@ -0,0 +1,598 @@
+"""Local stand-in for the subset of the OpenAI Assistants API used by this tool.
+
+Run it with ``python bench/fake_server.py --port 8765`` and point the client at
+it with ``OPENAI_BASE_URL=http://127.0.0.1:8765/v1``.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+def _indexed_bytes(size: int, chunking_strategy: dict | None) -> int:
+    """Roughly what a file takes once chunked: the overlaps are stored twice."""
+    static = (chunking_strategy or {}).get("static") or {}
+    chunk = static.get("max_chunk_size_tokens", 800)
+    overlap = static.get("chunk_overlap_tokens", 400)
+    return size * chunk // (chunk - overlap)
+
+
+class FakeState:
+    """Everything the server knows, guarded by one lock."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+                 max_inflight: int = 0, run_seconds: float = 0.5,
+                 slow_run_rate: float = 0.0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.run_seconds = run_seconds
+        self.slow_run_rate = slow_run_rate
+        self.lock = threading.Lock()
+        self.calls: dict[str, int] = {}
+        self.models = {
+            m: {"id": m, "object": "model", "created": 1700000000, "owned_by": "system"}
+            for m in ["gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"]
+        }
+        self.assistants: dict[str, dict] = {}
+        self.threads: dict[str, dict] = {}
+        self.messages: dict[str, list[dict]] = {}
+        self.runs: dict[str, dict] = {}
+        self.files: dict[str, dict] = {}
+        self.vector_stores: dict[str, dict] = {}
+        self.vs_files: dict[str, dict[str, dict]] = {}
+        self.file_batches: dict[str, dict] = {}
+
+    # Helpers
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def reset_calls(self) -> dict[str, int]:
+        with self.lock:
+            calls, self.calls = self.calls, {}
+        return calls
+
+    def add_message(self, thread_id: str, role: str, text: str, run_id=None,
+                    assistant_id=None) -> dict:
+        message = {
+            "id": _new_id("msg"),
+            "object": "thread.message",
+            "created_at": _now(),
+            "thread_id": thread_id,
+            "role": role,
+            "status": "completed",
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+            "attachments": [],
+            "metadata": {},
+            "assistant_id": assistant_id,
+            "run_id": run_id,
+        }
+        self.messages.setdefault(thread_id, []).append(message)
+        return message
+
+    def answer_for(self, thread_id: str) -> str:
+        question = ""
+        for message in reversed(self.messages.get(thread_id, [])):
+            if message["role"] == "user":
+                question = message["content"][0]["text"]["value"]
+                break
+        return f"The document says this about: {question}"
+
+    def new_run(self, thread_id: str, body: dict) -> dict:
+        assistant = self.assistants.get(body.get("assistant_id"), {})
+        run = {
+            "id": _new_id("run"),
+            "object": "thread.run",
+            "created_at": _now(),
+            "thread_id": thread_id,
+            "assistant_id": body.get("assistant_id"),
+            "status": "queued",
+            "model": body.get("model") or assistant.get("model", "gpt-4o"),
+            "instructions": body.get("instructions") or assistant.get("instructions", ""),
+            "tools": body.get("tools") or assistant.get("tools", []),
+            "metadata": body.get("metadata") or {},
+            "parallel_tool_calls": True,
+            "started_at": None,
+            "completed_at": None,
+            "cancelled_at": None,
+            "failed_at": None,
+            "expires_at": _now() + 600,
+            "last_error": None,
+            "required_action": None,
+            "incomplete_details": None,
+            "usage": None,
+            "max_prompt_tokens": body.get("max_prompt_tokens"),
+            "max_completion_tokens": body.get("max_completion_tokens"),
+            "truncation_strategy": body.get("truncation_strategy")
+            or {"type": "auto", "last_messages": None},
+            "tool_choice": "auto",
+            "response_format": "auto",
+            "_t0": time.monotonic(),
+            # Straggler runs take ten times longer
+            "_seconds": self.run_seconds * (10 if random.random() < self.slow_run_rate else 1),
+        }
+        for extra in body.get("additional_messages") or []:
+            self.add_message(thread_id, extra.get("role", "user"), str(extra.get("content", "")))
+        self.runs[run["id"]] = run
+        return run
+
+    def advance(self, run: dict) -> dict:
+        if run["status"] in ("completed", "cancelled", "failed", "expired"):
+            return run
+        if run["status"] == "cancelling":
+            run["status"] = "cancelled"
+            run["cancelled_at"] = _now()
+            return run
+        elapsed = time.monotonic() - run["_t0"]
+        if elapsed >= run["_seconds"]:
+            self.complete(run)
+        elif elapsed >= run["_seconds"] / 3:
+            run["status"] = "in_progress"
+            run["started_at"] = run["started_at"] or _now()
+        return run
+
+    def complete(self, run: dict) -> dict:
+        answer = self.answer_for(run["thread_id"])
+        self.add_message(run["thread_id"], "assistant", answer, run["id"], run["assistant_id"])
+        # The prompt is the thread (or its last messages) in words, plus a fixed overhead
+        context = self.messages.get(run["thread_id"], [])
+        last_messages = run["truncation_strategy"].get("last_messages")
+        if last_messages:
+            context = context[-last_messages:]
+        prompt = sum(len(m["content"][0]["text"]["value"].split()) for m in context) + 50
+        completion = len(answer.split())
+        run["status"] = "completed"
+        run["started_at"] = run["started_at"] or _now()
+        run["completed_at"] = _now()
+        run["usage"] = {"prompt_tokens": prompt, "completion_tokens": completion,
+                        "total_tokens": prompt + completion}
+        return run
+
+
+class Stream:
+    """Route result asking for a run to be streamed outside the state lock."""
+
+    def __init__(self, run: dict) -> None:
+        self.run = run
+
+
+def _public(obj: dict) -> dict:
+    return {k: v for k, v in obj.items() if not k.startswith("_")}
+
+
+def _page(items: list[dict], query: dict) -> dict:
+    order = query.get("order", ["desc"])[0]
+    limit = int(query.get("limit", ["20"])[0])
+    items = sorted(items, key=lambda i: (i.get("created_at", 0), i["_seq"] if "_seq" in i else 0),
+                   reverse=(order == "desc"))
+    after = query.get("after", [None])[0]
+    before = query.get("before", [None])[0]
+    ids = [i["id"] for i in items]
+    if after in ids:
+        items = items[ids.index(after) + 1:]
+    if before in ids:
+        items = items[:ids.index(before)]
+    data = [_public(i) for i in items[:limit]]
+    return {
+        "object": "list",
+        "data": data,
+        "first_id": data[0]["id"] if data else None,
+        "last_id": data[-1]["id"] if data else None,
+        "has_more": len(items) > limit,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    state: FakeState = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    # Plumbing
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            return self._multipart(raw, content_type)
+        return json.loads(raw) if raw else {}
+
+    def _multipart(self, raw: bytes, content_type: str) -> dict:
+        boundary = content_type.split("boundary=")[1].encode()
+        fields = {}
+        for part in raw.split(b"--" + boundary):
+            if b"\r\n\r\n" not in part:
+                continue
+            head, _, value = part.partition(b"\r\n\r\n")
+            value = value.rstrip(b"\r\n-")
+            name = re.search(rb'name="([^"]+)"', head)
+            filename = re.search(rb'filename="([^"]*)"', head)
+            if not name:
+                continue
+            if filename:
+                fields[name.group(1).decode()] = (filename.group(1).decode(), value)
+            else:
+                fields[name.group(1).decode()] = value.decode()
+        return fields
+
+    def _send(self, status: int, payload: dict, headers: dict = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("x-ratelimit-limit-requests", "5000")
+        self.send_header("x-ratelimit-remaining-requests", "4999")
+        self.send_header("x-ratelimit-reset-requests", "12ms")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject(self) -> bool:
+        """Apply the configured latency and failures; False if the call failed."""
+        state = self.state
+        if state.latency or state.jitter:
+            time.sleep(state.latency + random.random() * state.jitter)
+        if state.max_inflight and state.inflight > state.max_inflight:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                       headers={"Retry-After-Ms": "100"})
+            return False
+        if state.failure_rate and random.random() < state.failure_rate:
+            self._send(503, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str) -> None:
+        url = urlparse(self.path)
+        path = url.path.removeprefix("/v1").rstrip("/")
+        query = parse_qs(url.query)
+        route = re.sub(r"/(asst|thread|msg|run|step|file|vs|vsfb)_[0-9a-f]{20,}", "/{id}", path)
+        self.state.count(f"{method} {route}")
+        # Read the body first so that a failed call leaves the connection usable
+        body = self._body() if method == "POST" else {}
+        with self.state.lock:
+            self.state.inflight += 1
+        try:
+            if not self._inject():
+                return
+            parts = [p for p in path.split("/") if p]
+            with self.state.lock:
+                response = self._route(method, parts, query, body)
+            if isinstance(response, Stream):
+                self._stream_run(response.run)
+            elif isinstance(response, tuple):
+                self._send(*response)
+            else:
+                self._send(200, response)
+        finally:
+            with self.state.lock:
+                self.state.inflight -= 1
+
+    # Routing
+    def _route(self, method, parts, query, body):
+        s = self.state
+        head = parts[0] if parts else ""
+        if head == "models":
+            if len(parts) == 1:
+                return {"object": "list", "data": list(s.models.values())}
+            return s.models.get(parts[1]) or (404, {"error": {"message": "No model"}})
+        if head == "assistants":
+            return self._assistants(method, parts, query, body)
+        if head == "threads":
+            return self._threads(method, parts, query, body)
+        if head == "vector_stores":
+            return self._vector_stores(method, parts, query, body)
+        if head == "files":
+            return self._files(method, parts, query, body)
+        return 404, {"error": {"message": f"Unknown route {'/'.join(parts)}"}}
+
+    def _missing(self, what):
+        return 404, {"error": {"message": f"No {what} found", "type": "invalid_request_error"}}
+
+    def _deleted(self, obj_id, kind):
+        return {"id": obj_id, "object": f"{kind}.deleted", "deleted": True}
+
+    def _assistants(self, method, parts, query, body):
+        s = self.state
+        if len(parts) == 1:
+            if method == "GET":
+                return _page(list(s.assistants.values()), query)
+            assistant = {
+                "id": _new_id("asst"), "object": "assistant", "created_at": _now(),
+                "name": body.get("name"), "description": body.get("description"),
+                "model": body.get("model"), "instructions": body.get("instructions"),
+                "tools": body.get("tools", []), "metadata": body.get("metadata", {}),
+                "tool_resources": body.get("tool_resources") or {},
+                "top_p": 1.0, "temperature": 1.0, "response_format": "auto",
+            }
+            s.assistants[assistant["id"]] = assistant
+            return assistant
+        assistant = s.assistants.get(parts[1])
+        if assistant is None:
+            return self._missing("assistant")
+        if method == "DELETE":
+            del s.assistants[parts[1]]
+            return self._deleted(parts[1], "assistant")
+        if method == "POST":
+            assistant.update({k: v for k, v in body.items() if v is not None})
+        return assistant
+
+    def _threads(self, method, parts, query, body):
+        s = self.state
+        if len(parts) == 1:
+            thread = {"id": _new_id("thread"), "object": "thread", "created_at": _now(),
+                      "metadata": body.get("metadata", {}), "tool_resources": {}}
+            s.threads[thread["id"]] = thread
+            s.messages[thread["id"]] = []
+            for message in body.get("messages") or []:
+                s.add_message(thread["id"], message.get("role", "user"), str(message.get("content", "")))
+            return thread
+        if parts[1] == "runs":
+            thread = self._threads("POST", ["threads"], query, body.get("thread") or {})
+            run = s.new_run(thread["id"], body)
+            if body.get("stream"):
+                return Stream(run)
+            return _public(run)
+        thread = s.threads.get(parts[1])
+        if thread is None:
+            return self._missing("thread")
+        thread_id = thread["id"]
+        if len(parts) == 2:
+            if method == "DELETE":
+                del s.threads[thread_id]
+                s.messages.pop(thread_id, None)
+                return self._deleted(thread_id, "thread")
+            return thread
+        if parts[2] == "messages":
+            messages = s.messages[thread_id]
+            if len(parts) == 3:
+                if method == "POST":
+                    content = body.get("content")
+                    if isinstance(content, list):
+                        content = " ".join(c.get("text", "") for c in content)
+                    return s.add_message(thread_id, body.get("role", "user"), str(content))
+                run_id = query.get("run_id", [None])[0]
+                items = [m for m in messages if run_id is None or m["run_id"] == run_id]
+                for seq, m in enumerate(messages):
+                    m["_seq"] = seq
+                return _page(items, query)
+            found = [m for m in messages if m["id"] == parts[3]]
+            if not found:
+                return self._missing("message")
+            if method == "DELETE":
+                messages.remove(found[0])
+                return self._deleted(parts[3], "thread.message")
+            return _public(found[0])
+        if parts[2] == "runs":
+            if len(parts) == 3:
+                if method == "GET":
+                    runs = [r for r in s.runs.values() if r["thread_id"] == thread_id]
+                    return _page(runs, query)
+                run = s.new_run(thread_id, body)
+                if body.get("stream"):
+                    return Stream(run)
+                return _public(run)
+            run = s.runs.get(parts[3])
+            if run is None:
+                return self._missing("run")
+            if len(parts) == 5 and parts[4] == "cancel":
+                if run["status"] in ("queued", "in_progress"):
+                    run["status"] = "cancelling"
+                return _public(run)
+            if len(parts) >= 5 and parts[4] == "steps":
+                return {"object": "list", "data": [], "first_id": None, "last_id": None,
+                        "has_more": False}
+            return _public(s.advance(run))
+        return self._missing("route")
+
+    def _stream_run(self, run: dict) -> None:
+        """Write a run as server-sent events, completing it halfway through."""
+        s = self.state
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def emit(event, data):
+            chunk = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+
+        with s.lock:
+            created = _public(run)
+        emit("thread.run.created", created)
+        time.sleep(run["_seconds"] / 2)
+        with s.lock:
+            run["status"] = "in_progress"
+            run["started_at"] = _now()
+            in_progress = _public(run)
+            s.complete(run)
+            message = _public(s.messages[run["thread_id"]][-1])
+            completed = _public(run)
+        emit("thread.run.in_progress", in_progress)
+        emit("thread.message.created", dict(message, status="in_progress", content=[]))
+        for index, word in enumerate(message["content"][0]["text"]["value"].split(" ")):
+            delta = {"id": message["id"], "object": "thread.message.delta",
+                     "delta": {"content": [{"index": 0, "type": "text",
+                                            "text": {"value": (" " if index else "") + word,
+                                                     "annotations": []}}]}}
+            emit("thread.message.delta", delta)
+        emit("thread.message.completed", message)
+        emit("thread.run.completed", completed)
+        done = b"event: done\ndata: [DONE]\n\n"
+        self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+    def _vector_stores(self, method, parts, query, body):
+        s = self.state
+        if len(parts) == 1:
+            if method == "GET":
+                return _page(list(s.vector_stores.values()), query)
+            vs = {"id": _new_id("vs"), "object": "vector_store", "created_at": _now(),
+                  "name": body.get("name"), "usage_bytes": 0, "status": "completed",
+                  "file_counts": {"in_progress": 0, "completed": 0, "failed": 0,
+                                  "cancelled": 0, "total": 0},
+                  "expires_after": None, "expires_at": None, "last_active_at": _now(),
+                  "metadata": {}}
+            s.vector_stores[vs["id"]] = vs
+            s.vs_files[vs["id"]] = {}
+            for file_id in body.get("file_ids") or []:
+                self._attach(vs["id"], file_id, body.get("chunking_strategy"))
+            return vs
+        vs = s.vector_stores.get(parts[1])
+        if vs is None:
+            return self._missing("vector store")
+        vs_id = vs["id"]
+        if len(parts) == 2:
+            if method == "DELETE":
+                del s.vector_stores[vs_id]
+                s.vs_files.pop(vs_id, None)
+                return self._deleted(vs_id, "vector_store")
+            return vs
+        if parts[2] == "files":
+            if len(parts) == 3:
+                if method == "POST":
+                    return self._attach(vs_id, body["file_id"], body.get("chunking_strategy"))
+                return _page(list(s.vs_files[vs_id].values()), query)
+            vs_file = s.vs_files[vs_id].get(parts[3])
+            if vs_file is None:
+                return self._missing("vector store file")
+            if method == "DELETE":
+                del s.vs_files[vs_id][parts[3]]
+                self._recount(vs_id)
+                return self._deleted(parts[3], "vector_store.file")
+            return vs_file
+        if parts[2] == "file_batches":
+            if len(parts) == 3:
+                batch = {"id": _new_id("vsfb"), "object": "vector_store.files_batch",
+                         "created_at": _now(), "vector_store_id": vs_id, "status": "completed",
+                         "file_counts": {"in_progress": 0, "completed": 0, "failed": 0,
+                                         "cancelled": 0, "total": 0},
+                         "_file_ids": list(body.get("file_ids", []))}
+                for file_id in batch["_file_ids"]:
+                    vs_file = self._attach(vs_id, file_id, body.get("chunking_strategy"))
+                    key = "completed" if vs_file["status"] == "completed" else "failed"
+                    batch["file_counts"][key] += 1
+                    batch["file_counts"]["total"] += 1
+                s.file_batches[batch["id"]] = batch
+                return _public(batch)
+            batch = s.file_batches.get(parts[3])
+            if batch is None:
+                return self._missing("file batch")
+            if len(parts) == 5 and parts[4] == "files":
+                files = [s.vs_files[vs_id][f] for f in batch["_file_ids"] if f in s.vs_files[vs_id]]
+                return _page(files, query)
+            return _public(batch)
+        return self._missing("route")
+
+    def _attach(self, vs_id, file_id, chunking_strategy=None):
+        s = self.state
+        file = s.files.get(file_id)
+        vs_file = {"id": file_id, "object": "vector_store.file", "created_at": _now(),
+                   "vector_store_id": vs_id,
+                   "status": "completed" if file else "failed",
+                   "usage_bytes": _indexed_bytes(file["bytes"], chunking_strategy) if file else 0,
+                   "last_error": None if file else {"code": "invalid_file",
+                                                    "message": "File not found"},
+                   "chunking_strategy": chunking_strategy
+                   or {"type": "static", "static": {"max_chunk_size_tokens": 800,
+                                                    "chunk_overlap_tokens": 400}}}
+        s.vs_files[vs_id][file_id] = vs_file
+        self._recount(vs_id)
+        return vs_file
+
+    def _recount(self, vs_id):
+        s = self.state
+        files = s.vs_files[vs_id].values()
+        vs = s.vector_stores[vs_id]
+        vs["usage_bytes"] = sum(f["usage_bytes"] for f in files)
+        completed = sum(1 for f in files if f["status"] == "completed")
+        vs["file_counts"] = {"in_progress": 0, "completed": completed,
+                             "failed": len(files) - completed, "cancelled": 0,
+                             "total": len(files)}
+
+    def _files(self, method, parts, query, body):
+        s = self.state
+        if len(parts) == 1:
+            if method == "GET":
+                return {"object": "list", "data": [_public(f) for f in s.files.values()],
+                        "has_more": False}
+            filename, content = body.get("file", ("upload", b""))
+            file = {"id": _new_id("file"), "object": "file", "created_at": _now(),
+                    "filename": filename, "bytes": len(content),
+                    "purpose": body.get("purpose", "assistants"), "status": "processed"}
+            s.files[file["id"]] = file
+            return file
+        file = s.files.get(parts[1])
+        if file is None:
+            return self._missing("file")
+        if method == "DELETE":
+            del s.files[parts[1]]
+            return self._deleted(parts[1], "file")
+        return file
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, **options) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it."""
+    state = FakeState(**options)
+    handler = type("BoundHandler", (Handler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds per call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of calls answered with 503")
+    parser.add_argument("--slow-run-rate", type=float, default=0.0,
+                        help="Share of runs that take ten times --run-seconds")
+    parser.add_argument("--max-inflight", type=int, default=0,
+                        help="Answer calls beyond this many in flight with 429 (0: no limit)")
+    parser.add_argument("--run-seconds", type=float, default=0.5, help="Time a run takes to complete")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                   failure_rate=args.failure_rate, max_inflight=args.max_inflight,
+                   run_seconds=args.run_seconds, slow_run_rate=args.slow_run_rate)
+    print(f"Fake Assistants API listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Offline benchmarks against the local fake Assistants API.
+
+Measures startup-to-prompt of ``main.py`` with and without ``--resume``,
+chat turn latency, folder upload and message deletion throughput, and the
+API calls each of them makes, then compares the results with ``bench/baseline.json``:
+
+    python bench/run.py                    # compare, exit 1 on a regression
+    python bench/run.py --update-baseline  # store the results as the baseline
+"""
+
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import cache  # noqa: E402
+import fake_server  # noqa: E402
+import ratelimit  # noqa: E402
+import utils  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+
+# # Helpers
+@contextlib.contextmanager
+def scripted_input(answers: list[str], times: list[float] = None):
+    """Feed answers to input() and note when each one is asked for."""
+    answers = iter(answers)
+    original = builtins.input
+
+    def fake_input(prompt=""):
+        if times is not None:
+            times.append(time.perf_counter())
+        return next(answers)
+
+    builtins.input = fake_input
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def workdir():
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as path:
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(previous)
+
+
+def calls_made(server) -> int:
+    return sum(server.state.reset_calls().values())
+
+
+# # Benchmarks
+def bench_startup(server, base_url: str, ids: dict, repeats: int, resume: bool = False) -> dict:
+    """Wall time from launching main.py to its first chat prompt.
+
+    The full startup looks up the saved resources, passes the vector store
+    and upload prompts and starts on a fresh thread; with resume main.py
+    runs with --resume. Calls are counted once main.py has exited, so the
+    ones made in the background are included.
+    """
+    options = ["--resume"] if resume else []
+    # Enter past the vector store menu and the upload prompt
+    script = b"" if resume else b"\n\n"
+    seconds = []
+    calls = 0
+    for _ in range(repeats):
+        with workdir() as path:
+            with open(os.path.join(path, ".env"), "w") as file:
+                file.write("OPENAI_API_KEY=sk-bench\n")
+                file.writelines(f"{key}={value}\n" for key, value in ids.items())
+            calls_made(server)
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, "-u", os.path.join(ROOT, "main.py"), *options, "--no-answer-cache"],
+                cwd=path,
+                env={**os.environ, "OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "sk-bench"},
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            process.stdin.write(script)
+            process.stdin.flush()
+            output = b""
+            while b"User: " not in output:
+                chunk = process.stdout.read1(4096)
+                if not chunk:
+                    raise RuntimeError(f"main.py exited before the prompt:\n{output.decode()}")
+                output += chunk
+            seconds.append(time.perf_counter() - start)
+            process.communicate(b"exit\n", timeout=60)
+            calls += calls_made(server)
+    return {"seconds": statistics.median(seconds), "calls": calls / repeats}
+
+
+def bench_turns(client, server, ids: dict, turns: int) -> dict:
+    """Per-turn latency of utils.chat, from one question to the next prompt."""
+    cache.metadata.clear()
+    times = []
+    questions = [f"What does the document say about topic {n}?" for n in range(turns)]
+    with workdir(), quiet(), scripted_input(questions + ["exit"], times):
+        calls_made(server)
+        utils.chat(client, ids["ASSISTANT_ID"], ids["THREAD_ID"])
+    latencies = sorted(end - start for start, end in zip(times, times[1:]))
+    return {
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "calls": calls_made(server) / turns,
+    }
+
+
+def bench_upload(client, server, ids: dict, files: int, size: int) -> dict:
+    """Upload a folder through utils.upload_file_batch."""
+    cache.metadata.clear()
+    vector_store = client.beta.vector_stores.retrieve(ids["VECTOR_STORE_ID"])
+    with workdir(), quiet():
+        os.mkdir("docs")
+        for n in range(files):
+            with open(os.path.join("docs", f"doc{n}.txt"), "w") as file:
+                file.write(f"document {n}\n" + "x" * size)
+        calls_made(server)
+        with scripted_input(["docs", "y", ""]):
+            start = time.perf_counter()
+            utils.upload_file_batch(client, vector_store)
+            seconds = time.perf_counter() - start
+    return {"seconds": seconds, "files_per_s": files / seconds, "calls": calls_made(server)}
+
+
+def bench_delete(client, server, messages: int) -> dict:
+    """Delete every message of a thread with utils.delete_all_messages."""
+    thread = client.beta.threads.create()
+    with server.state.lock:
+        for n in range(messages):
+            server.state.add_message(thread.id, "user", f"message {n}")
+    calls_made(server)
+    with quiet():
+        start = time.perf_counter()
+        utils.delete_all_messages(client, thread.id)
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "messages_per_s": messages / seconds, "calls": calls_made(server)}
+
+
+# # Baseline
+# Metrics compared with the baseline; all of them are better when lower
+COMPARED = {
+    "startup": ("seconds", "calls"),
+    "resume": ("seconds", "calls"),
+    "turn": ("p50", "p95", "calls"),
+    "upload": ("seconds", "calls"),
+    "delete": ("seconds", "calls"),
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print results next to the baseline; returns the regressions."""
+    regressions = []
+    print(f"\n{'Benchmark':<20}{'Result':>12}{'Baseline':>12}{'Change':>10}\n" + "-" * 54)
+    for name, keys in COMPARED.items():
+        for key in keys:
+            value = results[name][key]
+            base = baseline.get("results", {}).get(name, {}).get(key)
+            change = f"{(value - base) / base:+.0%}" if base else ""
+            shown = f"{base:.3f}" if base is not None else "-"
+            print(f"{name + '.' + key:<20}{value:>12.3f}{shown:>12}{change:>10}")
+            # Call counts are exact; timings get some slack for noise
+            allowed = base if key == "calls" else (base or 0) * (1 + tolerance)
+            if base is not None and value > allowed + 1e-9:
+                regressions.append(f"{name}.{key}: {value:.3f} > {base}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every fake call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of calls answered with 503")
+    parser.add_argument("--run-seconds", type=float, default=0.5, help="Time a fake run takes")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--file-bytes", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3, help="Startup runs (the median is kept)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    config = {"latency": args.latency, "failure_rate": args.failure_rate, "run_seconds": args.run_seconds}
+    server = fake_server.serve(**config)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    client = ratelimit.make_client("sk-bench").with_options(base_url=base_url)
+
+    assistant = client.beta.assistants.create(
+        model="gpt-4o", name="bench", instructions="", tools=[{"type": "file_search"}]
+    )
+    vector_store = client.beta.vector_stores.create(name="bench")
+    ids = {
+        "ASSISTANT_ID": assistant.id,
+        "VECTOR_STORE_ID": vector_store.id,
+        "THREAD_ID": client.beta.threads.create().id,
+    }
+
+    results = {
+        "startup": bench_startup(server, base_url, ids, args.repeats),
+        "resume": bench_startup(server, base_url, ids, args.repeats, resume=True),
+        "turn": bench_turns(client, server, ids, args.turns),
+        "upload": bench_upload(client, server, ids, args.files, args.file_bytes),
+        "delete": bench_delete(client, server, args.messages),
+    }
+    workload = {
+        key: getattr(args, key) for key in ("turns", "files", "file_bytes", "messages", "repeats")
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as file:
+            json.dump({"config": config, "workload": workload, "results": results}, file, indent=2)
+        print(f"Baseline written to {BASELINE_PATH}")
+        return
+
+    try:
+        with open(BASELINE_PATH, "r") as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print("No baseline yet: run with --update-baseline to create one.")
+        return
+    if baseline.get("config") != config or baseline.get("workload") != workload:
+        print("Warning: the baseline was measured with other settings.")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
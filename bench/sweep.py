@@ -0,0 +1,209 @@
+"""Sweep chunking and file_search settings over a sample corpus.
+
+Every chunk size / overlap pair gets its own vector store with the corpus
+indexed under that chunking, and every max_num_results is asked the same
+question set on it. For each setting the answer latency, the run tokens, the
+vector store usage_bytes and a recall proxy are reported:
+
+    python bench/sweep.py CORPUS_FOLDER questions.jsonl --model gpt-4o-mini \\
+        --chunk-sizes 400 800 1600 --overlaps 0 200 400 --max-num-results 5 20
+
+Questions are JSONL objects with "question" and "expected", a list of
+phrases a good answer contains; the recall proxy is the share of them found
+in the answer. The vector stores, assistant and uploaded files are deleted
+afterwards unless --keep is given. Point OPENAI_BASE_URL at
+bench/fake_server.py to try the sweep offline.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from dotenv import load_dotenv  # noqa: E402
+
+import batch  # noqa: E402
+import bulk  # noqa: E402
+import ratelimit  # noqa: E402
+import retrieval  # noqa: E402
+import sync  # noqa: E402
+import utils  # noqa: E402
+
+
+def read_expected(path: str) -> list[dict]:
+    """The questions, each with its list of expected phrases."""
+    items = []
+    with open(path, "r") as file:
+        for number, line in enumerate(file, start=1):
+            if line.strip():
+                item = json.loads(line)
+                items.append(
+                    {
+                        "id": str(item.get("id", number)),
+                        "question": item["question"],
+                        "expected": item.get("expected", []),
+                    }
+                )
+    return items
+
+
+def recall(answer: str | None, expected: list[str]) -> float | None:
+    if not expected:
+        return None
+    answer = (answer or "").lower()
+    return sum(phrase.lower() in answer for phrase in expected) / len(expected)
+
+
+def upload_corpus(client, folder: str) -> list[str]:
+    """Upload every file of the folder once; the stores share the file IDs."""
+    paths = list(sync.walk_files(folder))
+    file_ids = []
+
+    def upload(path):
+        with open(path, "rb") as file:
+            file_ids.append(client.files.create(file=file, purpose="assistants").id)
+
+    result = bulk.bulk_apply(paths, upload, workers=4)
+    for path, error in result.failed.items():
+        print(f"  {path} failed: {error}")
+    return file_ids
+
+
+def index_corpus(client, file_ids: list[str], chunk_size: int, overlap: int):
+    """A new vector store with the files chunked as given; returns it indexed."""
+    vector_store = client.beta.vector_stores.create(name=f"sweep {chunk_size}/{overlap}")
+    retrieval.settings.set(
+        vector_store.id, max_chunk_size_tokens=chunk_size, chunk_overlap_tokens=overlap
+    )
+    start = time.perf_counter()
+    for n in range(0, len(file_ids), 500):
+        client.beta.vector_stores.file_batches.create_and_poll(
+            vector_store_id=vector_store.id,
+            file_ids=file_ids[n : n + 500],
+            **retrieval.settings.chunking_options(vector_store.id),
+        )
+    indexed = time.perf_counter() - start
+    return client.beta.vector_stores.retrieve(vector_store.id), indexed
+
+
+def ask_all(client, assistant_id: str, questions: list[dict], max_num_results: int, args) -> list:
+    run_options = {"tools": [retrieval.file_search_tool(max_num_results)]}
+
+    def ask(item):
+        result = batch.ask(client, assistant_id, item["question"], args.timeout, run_options=run_options)
+        result["recall"] = recall(result["answer"], item["expected"])
+        return result
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(ask, questions))
+
+
+def summarize(results: list[dict]) -> dict:
+    completed = [r for r in results if r["status"] == "completed"]
+    latencies = sorted(r["latency_s"] for r in completed)
+    recalls = [r["recall"] for r in results if r["recall"] is not None]
+    tokens = [r["usage"]["total_tokens"] for r in completed if r.get("usage")]
+    return {
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        if latencies
+        else None,
+        "tokens_mean": statistics.mean(tokens) if tokens else None,
+        "recall": statistics.mean(recalls) if recalls else None,
+    }
+
+
+def print_table(rows: list[dict]) -> None:
+    def shown(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    print(
+        f"\n{'Chunk':>6}{'Overlap':>8}{'Results':>8}{'Usage bytes':>13}"
+        f"{'p50 s':>8}{'p95 s':>8}{'Tokens':>9}{'Recall':>8}{'Failed':>8}\n" + "-" * 76
+    )
+    for row in rows:
+        print(
+            f"{row['max_chunk_size_tokens']:>6}{row['chunk_overlap_tokens']:>8}"
+            f"{row['max_num_results']:>8}{row['usage_bytes']:>13}"
+            f"{shown(row['latency_p50'], '.2f'):>8}{shown(row['latency_p95'], '.2f'):>8}"
+            f"{shown(row['tokens_mean'], '.0f'):>9}{shown(row['recall'], '.0%'):>8}{row['failed']:>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="Folder with the sample documents")
+    parser.add_argument("questions", help="JSONL questions with expected phrases")
+    parser.add_argument("--model", default=os.environ.get("DEFAULT_MODEL") or "gpt-4o-mini")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[400, 800, 1600])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 200, 400])
+    parser.add_argument("--max-num-results", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions asked at the same time")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--out", default="sweep_results.json", help="Where the results are written")
+    parser.add_argument("--keep", action="store_true", help="Keep the vector stores, assistant and files")
+    args = parser.parse_args()
+
+    load_dotenv(".env")
+    client = ratelimit.make_client(os.environ.get("OPENAI_API_KEY"))
+    questions = read_expected(args.questions)
+    chunkings = [
+        (size, overlap)
+        for size, overlap in itertools.product(args.chunk_sizes, args.overlaps)
+        if overlap <= size // 2
+    ]
+
+    print(f"Uploading {args.corpus}...")
+    file_ids = upload_corpus(client, args.corpus)
+    assistant = client.beta.assistants.create(
+        model=args.model,
+        name="retrieval sweep",
+        instructions=utils.instructions_from_file(os.path.join(ROOT, "instructions.txt")) or "",
+        tools=[retrieval.file_search_tool()],
+    )
+    created = []
+    rows = []
+    try:
+        for size, overlap in chunkings:
+            vector_store, indexed = index_corpus(client, file_ids, size, overlap)
+            created.append(vector_store.id)
+            print(f"Indexed with {size}/{overlap} tokens in {indexed:.1f}s: {vector_store.usage_bytes} bytes")
+            client.beta.assistants.update(
+                assistant.id, tool_resources={"file_search": {"vector_store_ids": [vector_store.id]}}
+            )
+            for max_num_results in args.max_num_results:
+                results = ask_all(client, assistant.id, questions, max_num_results, args)
+                rows.append(
+                    {
+                        "max_chunk_size_tokens": size,
+                        "chunk_overlap_tokens": overlap,
+                        "max_num_results": max_num_results,
+                        "usage_bytes": vector_store.usage_bytes,
+                        "index_s": round(indexed, 3),
+                        **summarize(results),
+                    }
+                )
+    finally:
+        if not args.keep:
+            client.beta.assistants.delete(assistant.id)
+            bulk.bulk_delete(created, lambda vs_id: client.beta.vector_stores.delete(vs_id))
+            bulk.bulk_delete(file_ids, client.files.delete)
+
+    print_table(rows)
+    with open(args.out, "w") as file:
+        json.dump({"model": args.model, "questions": len(questions), "settings": rows}, file, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
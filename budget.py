@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+# What to do when a thread goes over its token budget
+ACTIONS = ("warn", "rotate")
+
+
+class TokenBudget:
+    """Run limits and per-thread token totals.
+
+    run_options() gives the max_prompt_tokens, max_completion_tokens and
+    truncation_strategy to send with every run. record() adds a finished
+    run's usage to its thread's running total, which is kept in a JSON file
+    because threads outlive a session.
+    """
+
+    def __init__(
+        self,
+        max_prompt_tokens: int = None,
+        max_completion_tokens: int = None,
+        last_messages: int = None,
+        thread_budget: int = None,
+        action: str = "warn",
+        path: str = ".token_usage.json",
+    ) -> None:
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown budget action {action!r}, expected one of {ACTIONS}")
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.last_messages = last_messages
+        self.thread_budget = thread_budget
+        self.action = action
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as file:
+                self.threads: dict[str, dict] = json.load(file)
+        except FileNotFoundError:
+            self.threads = {}
+
+    def run_options(self) -> dict:
+        options = {}
+        if self.max_prompt_tokens:
+            options["max_prompt_tokens"] = self.max_prompt_tokens
+        if self.max_completion_tokens:
+            options["max_completion_tokens"] = self.max_completion_tokens
+        if self.last_messages:
+            options["truncation_strategy"] = {
+                "type": "last_messages",
+                "last_messages": self.last_messages,
+            }
+        return options
+
+    def record(self, thread_id: str, usage) -> dict:
+        """Add a run's usage to the thread's total and return the total."""
+        with self._lock:
+            totals = self.threads.setdefault(
+                thread_id,
+                {"turns": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            )
+            totals["turns"] += 1
+            if usage is not None:
+                totals["prompt_tokens"] += usage.prompt_tokens
+                totals["completion_tokens"] += usage.completion_tokens
+                totals["total_tokens"] += usage.total_tokens
+            self._save()
+            return dict(totals)
+
+    def total(self, thread_id: str) -> int:
+        return self.threads.get(thread_id, {}).get("total_tokens", 0)
+
+    def exceeded(self, thread_id: str) -> bool:
+        return bool(self.thread_budget) and self.total(thread_id) >= self.thread_budget
+
+    def forget(self, thread_id: str) -> None:
+        with self._lock:
+            if self.threads.pop(thread_id, None) is not None:
+                self._save()
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.threads, file, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import openai
+
+from ratelimit import AdaptiveLimiter
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a bulk operation."""
+
+    done: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def __str__(self) -> str:
+        rate = len(self.done) / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{len(self.done)} done, {len(self.failed)} failed "
+            f"in {self.elapsed:.2f}s ({rate:.1f}/s)"
+        )
+
+
+def _apply(action, item_id: str, limiter: AdaptiveLimiter, missing_ok: bool):
+    # Transient errors were already retried by the client's transport
+    try:
+        with limiter:
+            return action(item_id)
+    except openai.NotFoundError:
+        if not missing_ok:
+            raise
+        return None
+
+
+def bulk_apply(
+    item_ids,
+    action,
+    workers: int = 8,
+    on_done=None,
+    missing_ok: bool = False,
+) -> BulkResult:
+    """Call action(item_id) for every id on a bounded worker pool.
+
+    Transient API errors are retried by the client's RateLimitedTransport,
+    not here. A 404 fails the item unless missing_ok, which counts it as done. on_done(item_id, error) is
+    called after every item (error is None on success). The number of items
+    in flight adapts between 1 and workers: it halves when the API throttles.
+    """
+    limiter = AdaptiveLimiter(workers)
+    result = BulkResult()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_apply, action, item_id, limiter, missing_ok): item_id
+            for item_id in item_ids
+        }
+        for future in as_completed(futures):
+            item_id = futures[future]
+            error = future.exception()
+            if error is None:
+                result.done.append(item_id)
+            else:
+                result.failed[item_id] = str(error)
+            if on_done:
+                on_done(item_id, error)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def bulk_delete(item_ids, delete, workers: int = 8, on_done=None) -> BulkResult:
+    """bulk_apply for deletions: an item that is already gone counts as done."""
+    return bulk_apply(item_ids, delete, workers=workers, on_done=on_done, missing_ok=True)
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from pagination import paginate
+
+# Resource kinds the cache knows about
+KINDS = ("files", "vector_stores", "assistants", "models")
+
+
+class MetadataCache:
+    """In-memory TTL cache for listing and retrieve calls.
+
+    Entries are grouped by resource kind so that a write to a resource (create,
+    delete, attach, detach) can drop everything cached for that kind.
+    """
+
+    def __init__(self, ttl: float = 120.0) -> None:
+        self.ttl = ttl
+        self._entries: dict[tuple[str, str], tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        self.hits = {kind: 0 for kind in KINDS}
+        self.misses = {kind: 0 for kind in KINDS}
+        self._generations = {kind: 0 for kind in KINDS}
+
+    def get_or_load(self, kind: str, key: str, loader, ttl: float = None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None and entry[0] > now:
+                self.hits[kind] += 1
+                return entry[1]
+            self.misses[kind] += 1
+            generation = self._generations[kind]
+        value = loader()
+        with self._lock:
+            # Don't store a value loaded while the kind was being invalidated
+            if self._generations[kind] == generation:
+                self._entries[(kind, key)] = (now + (ttl or self.ttl), value)
+        return value
+
+    def list(self, kind: str, list_method, key: str = "list", **params) -> list:
+        """Every item of a paginated list call, served from memory while fresh."""
+        return self.get_or_load(kind, key, lambda: list(paginate(list_method, **params)))
+
+    def invalidate(self, *kinds: str) -> None:
+        with self._lock:
+            for kind in kinds:
+                self._generations[kind] += 1
+            for entry_key in [k for k in self._entries if k[0] in kinds]:
+                del self._entries[entry_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self) -> float:
+        hits = sum(self.hits.values())
+        total = hits + sum(self.misses.values())
+        return hits / total if total else 0.0
+
+
+metadata = MetadataCache()
+
+
+def vector_store_files(client, vector_store_id: str) -> list:
+    """The files of a vector store; dropped with the "vector_stores" kind."""
+    return metadata.list(
+        "vector_stores",
+        client.beta.vector_stores.files.list,
+        key=f"{vector_store_id}/files",
+        vector_store_id=vector_store_id,
+        limit=100,
+    )
@@ -0,0 +1,268 @@
+import asyncio
+import atexit
+import gzip
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+# Response headers kept in a cassette; the rest (cookies, dates, ...) is noise
+KEPT_HEADERS = (
+    "content-type",
+    "retry-after",
+    "retry-after-ms",
+    "x-request-id",
+    "openai-processing-ms",
+)
+
+# Request bodies up to this size are stored as text, bigger ones as a hash
+MAX_BODY_TEXT = 64 * 1024
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _url(url: httpx.URL) -> str:
+    query = url.query.decode()
+    return f"{url.path}?{query}" if query else url.path
+
+
+def _body_record(content: bytes):
+    if len(content) <= MAX_BODY_TEXT:
+        try:
+            return content.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+    return {"sha256": hashlib.sha256(content).hexdigest(), "bytes": len(content)}
+
+
+def _kept_headers(headers: httpx.Headers) -> dict:
+    return {
+        name: value
+        for name, value in headers.items()
+        if name in KEPT_HEADERS or name.startswith("x-ratelimit-")
+    }
+
+
+def load_env(path: str) -> dict:
+    """The saved IDs a cassette was recorded with (see RecordingTransport)."""
+    with _open(path, "r") as file:
+        header = json.loads(file.readline())
+    return header.get("env", {})
+
+
+# # Recording
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Forward requests and append each exchange to a JSONL cassette.
+
+    The first line of the cassette holds the saved IDs of the session (env),
+    then one line per request with the request body, the response status,
+    headers and body, the time to the response headers ("latency") and, for
+    each body chunk, the time it arrived. Paths ending in .gz are gzipped.
+    Authorization headers are never written.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        env: dict = None,
+        transport: httpx.BaseTransport = None,
+        async_transport: httpx.AsyncBaseTransport = None,
+    ) -> None:
+        self.path = path
+        self.transport = transport or httpx.HTTPTransport()
+        self.async_transport = async_transport or httpx.AsyncHTTPTransport()
+        self._lock = threading.Lock()
+        self._file = _open(path, "w")
+        # Clients close their transport more than once (sync and async), so the
+        # cassette is closed at exit; a gzipped one is unreadable until then
+        atexit.register(self._file.close)
+        self._write(
+            {
+                "cassette": 1,
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                "env": env or {},
+            }
+        )
+
+    def _write(self, entry: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def _entry(self, request: httpx.Request, response: httpx.Response, latency: float) -> dict:
+        return {
+            "method": request.method,
+            "url": _url(request.url),
+            "request": _body_record(request.content),
+            "status": response.status_code,
+            "headers": _kept_headers(response.headers),
+            "latency": round(latency, 4),
+            "chunks": [],
+        }
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        # Plain bodies keep the cassette readable and replayable as text
+        request.headers["Accept-Encoding"] = "identity"
+        request.read()
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        entry = self._entry(request, response, time.perf_counter() - start)
+        stream = response.stream
+
+        def chunks():
+            try:
+                for chunk in stream:
+                    offset = round(time.perf_counter() - start, 4)
+                    entry["chunks"].append([offset, chunk.decode("utf-8", "surrogateescape")])
+                    yield chunk
+            finally:
+                stream.close()
+                self._write(entry)
+
+        response.stream = _SyncStream(chunks())
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers["Accept-Encoding"] = "identity"
+        await request.aread()
+        start = time.perf_counter()
+        response = await self.async_transport.handle_async_request(request)
+        entry = self._entry(request, response, time.perf_counter() - start)
+        stream = response.stream
+
+        async def chunks():
+            try:
+                async for chunk in stream:
+                    offset = round(time.perf_counter() - start, 4)
+                    entry["chunks"].append([offset, chunk.decode("utf-8", "surrogateescape")])
+                    yield chunk
+            finally:
+                await stream.aclose()
+                self._write(entry)
+
+        response.stream = _AsyncStream(chunks())
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        # Each startup lookup runs in its own event loop and closes its client
+        await self.async_transport.aclose()
+        self.async_transport = httpx.AsyncHTTPTransport()
+
+
+class _SyncStream(httpx.SyncByteStream):
+    def __init__(self, iterator) -> None:
+        self._iterator = iterator
+
+    def __iter__(self):
+        yield from self._iterator
+
+    def close(self) -> None:
+        self._iterator.close()
+
+
+class _AsyncStream(httpx.AsyncByteStream):
+    def __init__(self, iterator) -> None:
+        self._iterator = iterator
+
+    async def __aiter__(self):
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self._iterator.aclose()
+
+
+# # Replay
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Serve the exchanges of a cassette instead of calling the API.
+
+    Requests are matched in recorded order by method, path and query, then
+    by method and path alone; once a key's exchanges are used up its last
+    one is served again. Unknown requests get a 501. With realtime=True the
+    recorded latency and chunk timings are reproduced, otherwise responses
+    come back as fast as possible.
+    """
+
+    def __init__(self, path: str, realtime: bool = False) -> None:
+        self.realtime = realtime
+        self.served = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+        # Exchanges by method and path, in recorded order
+        self._entries: dict[str, list[dict]] = {}
+        with _open(path, "r") as file:
+            self.env = json.loads(file.readline()).get("env", {})
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = f"{entry['method']} {entry['url'].split('?', 1)[0]}"
+                    self._entries.setdefault(key, []).append(entry)
+
+    def _next(self, request: httpx.Request) -> dict | None:
+        url = _url(request.url)
+        with self._lock:
+            entries = self._entries.get(f"{request.method} {request.url.path}")
+            if not entries:
+                self.missed += 1
+                return None
+            unused = [entry for entry in entries if not entry.get("used")]
+            exact = [entry for entry in entries if entry["url"] == url]
+            entry = next((e for e in unused if e["url"] == url), None) or (
+                unused[0] if unused else (exact or entries)[-1]
+            )
+            entry["used"] = True
+            self.served += 1
+            return entry
+
+    def _response(self, request: httpx.Request, entry: dict | None, stream) -> httpx.Response:
+        if entry is None:
+            return httpx.Response(
+                501,
+                json={"error": {"message": f"{request.method} {request.url.path} is not in the cassette"}},
+                request=request,
+            )
+        return httpx.Response(entry["status"], headers=entry["headers"], stream=stream, request=request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        start = time.perf_counter()
+        entry = self._next(request)
+        if entry is None:
+            return self._response(request, None, None)
+        if self.realtime:
+            time.sleep(max(0.0, entry["latency"] - (time.perf_counter() - start)))
+
+        def chunks():
+            for offset, text in entry["chunks"]:
+                if self.realtime:
+                    time.sleep(max(0.0, offset - (time.perf_counter() - start)))
+                yield text.encode("utf-8", "surrogateescape")
+
+        return self._response(request, entry, _SyncStream(chunks()))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        start = time.perf_counter()
+        entry = self._next(request)
+        if entry is None:
+            return self._response(request, None, None)
+        if self.realtime:
+            await asyncio.sleep(max(0.0, entry["latency"] - (time.perf_counter() - start)))
+
+        async def chunks():
+            for offset, text in entry["chunks"]:
+                if self.realtime:
+                    await asyncio.sleep(max(0.0, offset - (time.perf_counter() - start)))
+                yield text.encode("utf-8", "surrogateescape")
+
+        return self._response(request, entry, _AsyncStream(chunks()))
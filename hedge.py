@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import deque
+
+import metrics
+import prints
+import runs
+from pagination import paginate
+
+
+# # Hedge Tracker
+class HedgeTracker:
+    """Recent run latencies, the hedging threshold and hedging statistics.
+
+    A hedge fires once a run has been going for the `percentile` of the
+    recent latencies; with fewer than `min_samples` latencies it never fires.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.9,
+        window: int = 50,
+        min_samples: int = 5,
+        context_messages: int = 20,
+    ) -> None:
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.context_messages = context_messages
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.turns = 0
+        self.fired = 0
+        self.won = 0
+        # Lower bound: how long the losing run was known to still be going
+        # after the winning run finished
+        self.saved = 0.0
+
+    def threshold(self) -> float | None:
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def observe(self, latency: float) -> None:
+        self.latencies.append(latency)
+
+
+def _clone_messages(client, thread_id: str, limit: int) -> list[dict]:
+    """The last `limit` text messages of the thread, oldest first."""
+    page = client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=limit)
+    messages = []
+    for message in reversed(page.data):
+        text = "\n".join(c.text.value for c in message.content if c.type == "text")
+        if text:
+            messages.append({"role": message.role, "content": text})
+    return messages
+
+
+def _cancel(client, run):
+    """Cancel the run; returns it as the cancel left it, or None."""
+    try:
+        return client.beta.threads.runs.cancel(thread_id=run.thread_id, run_id=run.id)
+    except Exception:
+        # It finished or was cancelled in the meantime
+        return None
+
+
+def _discard_clone(client, run) -> None:
+    """Cancel a clone's run and delete its thread without blocking the turn."""
+
+    def discard():
+        _cancel(client, run)
+        try:
+            client.beta.threads.delete(run.thread_id)
+        except Exception:
+            pass
+
+    threading.Thread(target=discard, daemon=True).start()
+
+
+def _replace_answer(client, thread_id: str, primary, answer: str):
+    """Write the clone's answer in place of the cancelled primary run's."""
+    runs.wait_for_run(client, primary, timeout=30.0)
+    # Drop whatever the cancelled run managed to write
+    written = paginate(client.beta.threads.messages.list, thread_id=thread_id, run_id=primary.id)
+    for message in list(written):
+        client.beta.threads.messages.delete(thread_id=thread_id, message_id=message.id)
+    return client.beta.threads.messages.create(
+        thread_id=thread_id, role="assistant", content=answer
+    )
+
+
+# # Hedged Run
+def hedged_run(
+    client,
+    assistant_id: str,
+    thread_id: str,
+    tracker: HedgeTracker,
+    run,
+    timeout: float = None,
+    run_options: dict = None,
+):
+    """Wait for `run`, racing a duplicate on a throwaway clone if it is slow.
+
+    If the run has not stopped by the tracker's threshold, the last messages
+    of the thread are copied into a new thread and the same assistant runs
+    there. The first run to complete wins and the other one is cancelled. Only
+    the winning answer ends up in the user's thread. Returns the winning run
+    and the answer message in the user's thread (None if there is none).
+    The clone's run gets the same run_options as the primary one.
+    """
+    tracker.turns += 1
+    start = time.monotonic()
+    waiter = runs.RunWaiter(client, on_status=prints.print_run_status)
+    waiter.add(run, timeout)
+    threshold = tracker.threshold()
+    clone = None
+    with metrics.span("run wait", hedged=False) as wait_span:
+        winner = waiter.wait_first(until=start + threshold if threshold is not None else None)
+        if winner is None:
+            tracker.fired += 1
+            wait_span.attributes["hedged"] = True
+            with metrics.span("hedge start"):
+                messages = _clone_messages(client, thread_id, tracker.context_messages)
+                clone = client.beta.threads.create_and_run(
+                    assistant_id=assistant_id,
+                    thread={"messages": messages},
+                    **(run_options or {}),
+                )
+            print(f"Run {run.id} is slow, hedging with run {clone.id}")
+            remaining = timeout - (time.monotonic() - start) if timeout is not None else None
+            waiter.add(clone, remaining)
+            # The first run to complete wins; a failed one leaves the race to the other
+            while True:
+                winner = waiter.wait_first()
+                if winner.status == "completed" or not waiter.pending():
+                    break
+
+    elapsed = time.monotonic() - start
+    if winner.status == "completed":
+        tracker.observe(elapsed)
+
+    if clone is not None and winner.id == clone.id and winner.status == "completed":
+        tracker.won += 1
+        waiter.discard(run.id)
+        with metrics.span("response fetch"):
+            answer = prints.print_response(client, clone.thread_id, clone.id)
+        cancelled = _cancel(client, run)
+        if cancelled is not None and cancelled.status != "completed":
+            # The primary was still running this long after the clone finished
+            tracker.saved += time.monotonic() - (start + elapsed)
+        message = None
+        if answer is not None:
+            text = "\n".join(c.text.value for c in answer.content if c.type == "text")
+            with metrics.span("answer write"):
+                message = _replace_answer(client, thread_id, run, text)
+        _discard_clone(client, clone)
+        return winner, message
+
+    if clone is not None:
+        waiter.discard(clone.id)
+        _discard_clone(client, clone)
+    if winner.status != "completed":
+        prints.print_run_error(winner)
+        return winner, None
+    with metrics.span("response fetch"):
+        return winner, prints.print_response(client, thread_id, winner.id)
@@ -0,0 +1,216 @@
+import queue
+import threading
+import time
+
+import bulk
+import cache
+import retrieval
+import uploads
+from runs import Backoff
+
+# File batch statuses that will not change any more
+BATCH_DONE_STATUSES = frozenset({"completed", "failed", "cancelled"})
+
+
+class _Job:
+    def __init__(self, paths: list[str], digests: dict[str, str], on_done) -> None:
+        self.paths = paths
+        self.digests = digests
+        self.on_done = on_done
+        self.result = {"uploaded": [], "attached": [], "skipped": [], "failed": {}}
+        self.batches: set[str] = set()
+        self.submitted = False
+
+
+# # Ingestion Queue
+class IngestQueue:
+    """Upload files and index them in a vector store on a background worker.
+
+    submit() returns at once. The worker uploads each job in chunks of
+    `chunk_size` files and attaches every chunk with its own file batch, so
+    the first files become searchable while the rest are still uploading.
+    Batches are polled with backoff between chunks and while the queue is
+    idle; status() gives the file counts for a progress line. With a
+    preprocessor documents are uploaded as compact text.
+    """
+
+    def __init__(
+        self,
+        client,
+        vector_store_id: str,
+        index: uploads.UploadIndex = None,
+        chunk_size: int = 50,
+        workers: int = 4,
+        backoff: Backoff = None,
+        preprocessor=None,
+    ) -> None:
+        self.client = client
+        self.vector_store_id = vector_store_id
+        self.index = index or uploads.UploadIndex()
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.backoff = backoff or Backoff(initial=0.5, maximum=10.0)
+        self.preprocessor = preprocessor
+        self.counts = {"queued": 0, "uploading": 0, "indexing": 0, "ready": 0, "skipped": 0, "failed": 0}
+        self.errors: dict[str, str] = {}
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        # Batches being indexed: batch ID -> (job, attempt, next poll time)
+        self._batches: dict[str, tuple[_Job, int, float]] = {}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, paths: list[str], digests: dict[str, str] = None, on_done=None) -> None:
+        """Queue files for upload; on_done(result) is called once they are indexed.
+
+        The result has the same keys as uploads.upload_new_files returns.
+        """
+        with self._lock:
+            self.counts["queued"] += len(paths)
+        self._jobs.put(_Job(list(paths), digests, on_done))
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def busy(self) -> bool:
+        with self._lock:
+            return bool(self.counts["queued"] or self.counts["uploading"] or self._batches)
+
+    def close(self) -> None:
+        """Finish the queued uploads and wait for their batches to be indexed."""
+        self._jobs.put(None)
+        self._thread.join()
+
+    # Worker
+    def _run(self) -> None:
+        while True:
+            try:
+                job = self._jobs.get(timeout=self._next_poll_in())
+            except queue.Empty:
+                self._poll_batches()
+                continue
+            if job is None:
+                break
+            self._ingest(job)
+            job.submitted = True
+            self._finish_if_done(job)
+        # Closing: the uploads are done, wait for the indexing
+        while self._batches:
+            time.sleep(self._next_poll_in() or 0)
+            self._poll_batches()
+
+    def _next_poll_in(self) -> float | None:
+        with self._lock:
+            if not self._batches:
+                return None
+            next_poll = min(entry[2] for entry in self._batches.values())
+        return max(0.0, next_poll - time.monotonic())
+
+    def _fail(self, job: _Job, items: list[str], error: str, counter: str) -> None:
+        with self._lock:
+            self.counts[counter] -= len(items)
+            self.counts["failed"] += len(items)
+            for item in items:
+                job.result["failed"][item] = error
+                self.errors[item] = error
+
+    def _ingest(self, job: _Job) -> None:
+        try:
+            to_upload, to_attach, skipped = uploads.plan_uploads(
+                self.client, job.paths, self.vector_store_id, self.index, job.digests, self.preprocessor
+            )
+        except Exception as e:
+            self._fail(job, job.paths, str(e), "queued")
+            return
+        with self._lock:
+            job.result["skipped"] = skipped
+            self.counts["queued"] -= len(skipped) + len(to_attach)
+            self.counts["skipped"] += len(skipped)
+        if to_attach:
+            self._attach(job, to_attach)
+
+        paths = list(to_upload)
+        for start in range(0, len(paths), self.chunk_size):
+            chunk = paths[start : start + self.chunk_size]
+            with self._lock:
+                self.counts["queued"] -= len(chunk)
+                self.counts["uploading"] += len(chunk)
+            file_ids = []
+
+            def upload(path):
+                file_ids.append(
+                    uploads.upload_file(
+                        self.client, path, to_upload[path], self.index, self.preprocessor
+                    )
+                )
+
+            result = bulk.bulk_apply(chunk, upload, workers=self.workers)
+            self.index.save()
+            if result.done:
+                cache.metadata.invalidate("files")
+            with self._lock:
+                self.counts["uploading"] -= len(chunk)
+                self.counts["failed"] += len(result.failed)
+                self.errors.update(result.failed)
+                job.result["uploaded"] += result.done
+                job.result["failed"].update(result.failed)
+            if file_ids:
+                self._attach(job, file_ids)
+            self._poll_batches()
+
+    def _attach(self, job: _Job, file_ids: list[str]) -> None:
+        with self._lock:
+            self.counts["indexing"] += len(file_ids)
+        try:
+            batch = self.client.beta.vector_stores.file_batches.create(
+                vector_store_id=self.vector_store_id,
+                file_ids=file_ids,
+                **retrieval.settings.chunking_options(self.vector_store_id),
+            )
+        except Exception as e:
+            self._fail(job, file_ids, str(e), "indexing")
+            return
+        cache.metadata.invalidate("vector_stores")
+        with self._lock:
+            job.result["attached"] += file_ids
+            job.batches.add(batch.id)
+            self._batches[batch.id] = (job, 0, time.monotonic() + self.backoff.delay(0))
+
+    def _poll_batches(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            due = [batch_id for batch_id, entry in self._batches.items() if entry[2] <= now]
+        for batch_id in due:
+            job, attempt, _ = self._batches[batch_id]
+            try:
+                batch = self.client.beta.vector_stores.file_batches.retrieve(
+                    batch_id, vector_store_id=self.vector_store_id
+                )
+            except Exception:
+                batch = None
+            if batch is None or batch.status not in BATCH_DONE_STATUSES:
+                next_poll = time.monotonic() + self.backoff.delay(attempt + 1)
+                with self._lock:
+                    self._batches[batch_id] = (job, attempt + 1, next_poll)
+                continue
+            counts = batch.file_counts
+            with self._lock:
+                del self._batches[batch_id]
+                job.batches.discard(batch_id)
+                self.counts["indexing"] -= counts.total
+                self.counts["ready"] += counts.completed
+                self.counts["failed"] += counts.total - counts.completed
+            # The new files are searchable now; listings must be reloaded
+            cache.metadata.invalidate("vector_stores")
+            self._finish_if_done(job)
+
+    def _finish_if_done(self, job: _Job) -> None:
+        with self._lock:
+            if not job.submitted or job.batches or job.on_done is None:
+                return
+            on_done, job.on_done = job.on_done, None
+        try:
+            on_done(job.result)
+        except Exception as e:
+            print(f"\nIngestion callback failed: {str(e)}")
@@ -1,11 +1,24 @@
+import argparse
 import os
 import sys
 from typing import Final
 
+import openai
 from dotenv import load_dotenv
-from openai import OpenAI
 
+import answers
+import batch
+import budget
+import cache
+import cassette
+import hedge
+import ingest
+import metrics
+import preprocess
 import prints
+import ratelimit
+import retrieval
+import startup
 import utils
 
 # setup = input(
@@ -17,24 +30,228 @@ import utils
 #     + "[4] Change defaults [Advanced] \n"
 # )
 
+parser = argparse.ArgumentParser(description="Chat with an assistant over your documents.")
+parser.add_argument(
+    "--no-answer-cache",
+    action="store_true",
+    help="Always ask the assistant, bypassing the local answer cache.",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Continue the saved conversation right away if .env has all saved IDs.",
+)
+parser.add_argument(
+    "--separate-calls",
+    action="store_true",
+    help="Create each message in its own call before the run instead of sending it with the run.",
+)
+parser.add_argument(
+    "--hedge",
+    type=float,
+    nargs="?",
+    const=0.9,
+    metavar="PERCENTILE",
+    help="Poll runs and start a duplicate on a copy of the thread when one runs longer "
+    "than this percentile of recent turns (default: %(const)s).",
+)
+parser.add_argument(
+    "--max-num-results",
+    type=int,
+    metavar="N",
+    help="Most chunks file_search may return per run, overriding retrieval.json.",
+)
+parser.add_argument(
+    "--max-prompt-tokens",
+    type=int,
+    metavar="N",
+    help="Most prompt tokens a single run may use, across all of its steps.",
+)
+parser.add_argument(
+    "--max-completion-tokens",
+    type=int,
+    metavar="N",
+    help="Most completion tokens a single run may use, across all of its steps.",
+)
+parser.add_argument(
+    "--truncate-last",
+    type=int,
+    metavar="N",
+    help="Only send the last N messages of the thread with each run.",
+)
+parser.add_argument(
+    "--thread-token-budget",
+    type=int,
+    metavar="N",
+    help="Total tokens a thread may use before --on-budget applies.",
+)
+parser.add_argument(
+    "--on-budget",
+    choices=budget.ACTIONS,
+    default="warn",
+    help="What to do when a thread goes over its token budget (default: %(default)s).",
+)
+parser.add_argument(
+    "--preprocess",
+    action="store_true",
+    help="Upload the text of PDF and text files, without repeated headers and duplicate "
+    "paragraphs, instead of the files themselves (PDFs need pypdf).",
+)
+parser.add_argument(
+    "--batch",
+    metavar="QUESTIONS",
+    help="Answer the questions of a JSONL or CSV file headlessly and exit.",
+)
+parser.add_argument(
+    "--out",
+    default="batch_results.jsonl",
+    help="JSONL file the batch results are appended to (default: %(default)s).",
+)
+parser.add_argument(
+    "--concurrency",
+    type=int,
+    default=8,
+    help="Questions answered at the same time in batch mode (default: %(default)s).",
+)
+parser.add_argument(
+    "--retry-failed",
+    action="store_true",
+    help="In batch mode, ask again the questions whose recorded run did not complete.",
+)
+parser.add_argument(
+    "--record",
+    metavar="CASSETTE",
+    help="Record every API exchange of the session to a cassette (.jsonl or .jsonl.gz).",
+)
+parser.add_argument(
+    "--replay",
+    metavar="CASSETTE",
+    help="Serve the API from a recorded cassette instead of the network. "
+    "Run it in a scratch folder: the saved IDs in .env are replaced by the recorded ones.",
+)
+parser.add_argument(
+    "--realtime",
+    action="store_true",
+    help="With --replay, reproduce the recorded response times instead of answering at once.",
+)
+args = parser.parse_args()
+hedge_tracker = hedge.HedgeTracker(args.hedge) if args.hedge else None
+token_budget = budget.TokenBudget(
+    max_prompt_tokens=args.max_prompt_tokens,
+    max_completion_tokens=args.max_completion_tokens,
+    last_messages=args.truncate_last,
+    thread_budget=args.thread_token_budget,
+    action=args.on_budget,
+)
+run_options = {}
+if args.max_num_results is not None:
+    try:
+        retrieval.validate({"max_num_results": args.max_num_results})
+    except ValueError as e:
+        parser.error(str(e))
+    run_options["tools"] = [retrieval.file_search_tool(args.max_num_results)]
+
 env_path = ".env"
 utils.check_env(env_path)
 
-# Load environment variables
+timings = startup.StartupTimings()
+
+# Fast path: chat on the saved resources and validate them in the background
+load_dotenv(env_path, override=True)
+
+# Record/replay happens below the rate limiter, so replayed 429s are retried as they were
+transport = None
+replay_env = {}
+if args.replay:
+    transport = cassette.ReplayTransport(args.replay, realtime=args.realtime)
+    replay_env = {"OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "replay", **transport.env}
+    os.environ.update(replay_env)
+    # A cached answer would skip the recorded calls
+    args.no_answer_cache = True
+elif args.record:
+    transport = cassette.RecordingTransport(
+        args.record,
+        env={
+            key: os.environ[key]
+            for key in ("ASSISTANT_ID", "VECTOR_STORE_ID", "THREAD_ID", "DEFAULT_MODEL")
+            if os.environ.get(key)
+        },
+    )
+saved_ids = [os.environ.get(key) for key in ("ASSISTANT_ID", "VECTOR_STORE_ID", "THREAD_ID")]
+
+# Headless batch mode on the saved assistant
+if args.batch:
+    if not (os.environ.get("OPENAI_API_KEY") and saved_ids[0]):
+        sys.exit("Batch mode needs OPENAI_API_KEY and ASSISTANT_ID in .env. Run once interactively first.")
+    client = ratelimit.make_client(os.environ.get("OPENAI_API_KEY"), transport=transport)
+    answer_cache = None if args.no_answer_cache else answers.AnswerCache()
+    result = batch.run_batch(
+        client,
+        saved_ids[0],
+        args.batch,
+        args.out,
+        concurrency=args.concurrency,
+        retry_failed=args.retry_failed,
+        answer_cache=answer_cache,
+        run_options={**run_options, **token_budget.run_options()},
+    )
+    prints.print_batch_result(result, args.out)
+    prints.print_rate_limit_stats(ratelimit.stats)
+    metrics.registry.export()
+    sys.exit(0)
+
+if args.resume and os.environ.get("OPENAI_API_KEY") and all(saved_ids):
+    client = ratelimit.make_client(os.environ.get("OPENAI_API_KEY"), transport=transport)
+    validator = startup.validate_in_background(os.environ.get("OPENAI_API_KEY"), *saved_ids, transport)
+    timings.report()
+    timings.save()
+    answer_cache = None if args.no_answer_cache else answers.AnswerCache()
+    utils.chat(
+        client,
+        saved_ids[0],
+        saved_ids[2],
+        answer_cache=answer_cache,
+        fold=not args.separate_calls,
+        hedge_tracker=hedge_tracker,
+        token_budget=token_budget,
+        run_options=run_options,
+    )
+    # Let the validation finish, so a short session still gets its warnings
+    validator.join()
+    prints.print_cache_stats(cache.metadata)
+    prints.print_rate_limit_stats(ratelimit.stats)
+    sys.exit(0)
+
+# Load environment variables, validate the key and look up saved resources concurrently
 while True:
     try:
         load_dotenv(env_path, override=True)
+        os.environ.update(replay_env)
         OPENAI_API_KEY: Final = os.environ.get("OPENAI_API_KEY")
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        models_object = client.models.list()
+        resources = startup.startup(
+            OPENAI_API_KEY,
+            os.environ.get("ASSISTANT_ID"),
+            os.environ.get("VECTOR_STORE_ID"),
+            os.environ.get("THREAD_ID"),
+            timings,
+            transport,
+        )
+        client = ratelimit.make_client(OPENAI_API_KEY, transport=transport)
         break
+    except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+        # Not a key problem: asking for another key would not help
+        sys.exit(f"Error: {str(e)}\nThe API is unavailable right now, please try again later.")
     except Exception as e:
         print(f"Error: {str(e)}\n")
         api_key = input("Please enter your OpenAI API Key: ").strip()
         utils.update_env(api_key=api_key)
         continue
 
-models: dict[str] = utils.create_models_dict(models_object)
+# The model list is only needed to create an assistant; it is loaded from the catalog then
+models: dict[str] = None
+if resources["models"] is not None:
+    models = utils.create_models_dict(resources["models"])
+    utils.save_model_catalog(models)
 
 ASSISTANT_ID: Final = os.environ.get("ASSISTANT_ID")
 THREAD_ID: Final = os.environ.get("THREAD_ID")
@@ -48,13 +265,26 @@ default_model = DEFAULT_MODEL
 
 # Assistant, Thread and Vector Store
 instructions = utils.instructions_from_file()
-assistant = utils.retrieve_or_create_assistant(
-    client, assistant_id, models, default_model, instructions
-)
+assistant = resources["assistant"]
+if assistant is None:
+    print("Assistant NOT found! You need to CREATE A NEW ASSISTANT.")
+    assistant = utils.prompt_create_assistant(client, models, default_model, instructions)
+else:
+    print(f'Assistant "{assistant.name}" retrieved. ID: {assistant.id}')
 
-vector_store = utils.retrieve_or_create_vector_store(client, vector_store_id)
+vector_store = resources["vector_store"]
+if vector_store is None:
+    print("Vector Store NOT found!\nCreating a NEW VECTOR STORE.")
+    vector_store = utils.create_vector_store(client)
+else:
+    print(f'Vector Store "{vector_store.name}" retrieved. ID: {vector_store.id}')
 
-thread = utils.retrieve_or_create_thread(client, thread_id)
+thread = resources["thread"]
+if thread is None:
+    print("Thread NOT found! Creating a NEW THREAD.")
+    thread = utils.create_thread(client)
+else:
+    print(f"Thread retrieved. ID: {thread.id}")
 
 # Update Environment
 utils.update_env(
@@ -66,34 +296,73 @@ utils.update_env(
     default_model=assistant.model,
 )
 
+# A thread created in this launch or never used needs no cold start
+fresh_thread = resources["thread"] is None or not utils.has_messages(client, thread.id)
+# Pre-create empty threads in the background for the cold start
+rotator = utils.ThreadRotator(
+    client, env_path=env_path, prefill=not fresh_thread, on_retire=token_budget.forget
+)
+
 # File Handling
 # files_list = prints.list_files(client)
 
-utils.manage_vector_stores(client, vector_store)
+preprocessor = None
+if args.preprocess:
+    preprocessor = preprocess.Preprocessor()
+    if preprocess.pypdf is None:
+        print("pypdf is not installed (pip install pypdf): PDFs will be uploaded as they are.")
 
-file_batch = utils.upload_file_batch(client, vector_store)
+utils.manage_vector_stores(client, vector_store, preprocessor=preprocessor)
 
-assistant = client.beta.assistants.update(
-    assistant_id=assistant.id,
-    tool_resources={"file_search": {"vector_store_ids": [vector_store.id]}},
-)
+# Uploads and indexing continue in the background while the chat starts
+ingest_queue = ingest.IngestQueue(client, vector_store.id, preprocessor=preprocessor)
+utils.upload_file_batch(client, vector_store, ingest_queue=ingest_queue)
+
+with timings.measure("reconcile assistant"):
+    assistant = utils.reconcile_assistant(client, assistant, vector_store.id)
 
 # assistant = utils.update_assistant(
 #     client, assistant.id, vector_store.id, instructions, default_model
 # )
 
 # List vector store files again
-files_list = prints.list_files(client)
+with timings.measure("files.list"):
+    files_list = prints.list_files(client)
 
 # Create VS File
 # utils.create_vs_file(client, files_list, vector_store.id)
 
 
 # # Fresh Start
-utils.cold_start(client, thread.id)
+with timings.measure("cold start"):
+    thread_id = utils.cold_start(client, thread.id, rotator, fresh=fresh_thread)
+
+timings.report()
+timings.save()
 
 # # Chat
-utils.chat(client, assistant.id, thread.id)
+answer_cache = None if args.no_answer_cache else answers.AnswerCache()
+utils.chat(
+    client,
+    assistant.id,
+    thread_id,
+    answer_cache=answer_cache,
+    fold=not args.separate_calls,
+    hedge_tracker=hedge_tracker,
+    token_budget=token_budget,
+    rotator=rotator,
+    ingest_queue=ingest_queue,
+    run_options=run_options,
+)
+if ingest_queue.busy():
+    print("Waiting for the queued files to finish uploading and indexing...")
+ingest_queue.close()
+prints.print_ingest_status(ingest_queue.status())
+if preprocessor is not None:
+    prints.print_preprocess_reports(preprocessor.take_reports())
+rotator.close()
+prints.print_cache_stats(cache.metadata)
+prints.print_rate_limit_stats(ratelimit.stats)
 
 
 sys.exit(0)
@@ -0,0 +1,303 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import httpx
+
+# Quantiles kept for every histogram
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """"POST /threads/{id}/runs" style name with the resource IDs taken out."""
+    path = path.removeprefix("/v1")
+    return f"{method} " + re.sub(r"/[a-z]+[_-][A-Za-z0-9]{8,}", "/{id}", path)
+
+
+# # Histograms
+class Histogram:
+    """Count, sum and a window of recent samples for percentiles."""
+
+    def __init__(self, window: int = 2048) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            **{f"p{int(q * 100)}": round(self.percentile(q), 6) for q in QUANTILES},
+        }
+
+
+# # Spans
+class Span:
+    """A timed step; spans started while it is open become its children."""
+
+    def __init__(self, name: str, registry: "Metrics", **attributes) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.children: list[Span] = []
+        self.calls: list[dict] = []
+        self.duration = None
+        self._registry = registry
+        self._start = time.perf_counter()
+
+    def finish(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+            self._registry._finish(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.finish()
+
+    def call_count(self) -> int:
+        """API calls made in this span and its children."""
+        return len(self.calls) + sum(child.call_count() for child in self.children)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "duration": round(self.duration or 0.0, 6),
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **({"calls": self.calls} if self.calls else {}),
+            **({"children": [child.to_dict() for child in self.children]} if self.children else {}),
+        }
+
+
+# # Registry
+class Metrics:
+    """Per-endpoint API call metrics and span timings, exportable as JSON and
+    Prometheus text."""
+
+    def __init__(self, max_traces: int = 100) -> None:
+        self.calls: dict[tuple[str, str], int] = {}
+        self.retries: dict[str, int] = {}
+        self.bytes: dict[tuple[str, str], int] = {}
+        self.latency: dict[str, Histogram] = {}
+        self.spans: dict[str, Histogram] = {}
+        self.traces: deque[dict] = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # Calls
+    def record_call(
+        self,
+        endpoint: str,
+        status: str,
+        latency: float,
+        retries: int = 0,
+        sent: int = 0,
+        received: int = 0,
+        span: Span = None,
+    ) -> None:
+        """Count a call; it is also listed in `span`, the one it was sent in."""
+        with self._lock:
+            self.calls[(endpoint, status)] = self.calls.get((endpoint, status), 0) + 1
+            self.retries[endpoint] = self.retries.get(endpoint, 0) + retries
+            for direction, amount in (("sent", sent), ("received", received)):
+                key = (endpoint, direction)
+                self.bytes[key] = self.bytes.get(key, 0) + amount
+            self.latency.setdefault(endpoint, Histogram()).observe(latency)
+        if span is not None:
+            span.calls.append(
+                {"endpoint": endpoint, "status": status, "latency": round(latency, 6), "retries": retries}
+            )
+
+    # Spans
+    def _stack(self) -> list[Span]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current_span(self) -> Span | None:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def propagate(self, f):
+        """Wrap f to run in the calling thread's current span on any thread."""
+        span = self.current_span()
+        if span is None:
+            return f
+
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            stack.append(span)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                stack.remove(span)
+
+        return wrapper
+
+    def span(self, name: str, **attributes) -> Span:
+        """Start a span; use it as a context manager or call finish()."""
+        span = Span(name, self, **attributes)
+        parent = self.current_span()
+        if parent is not None:
+            parent.children.append(span)
+        self._stack().append(span)
+        return span
+
+    def _finish(self, span: Span) -> None:
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+        with self._lock:
+            self.spans.setdefault(span.name, Histogram()).observe(span.duration)
+            if not stack:
+                self.traces.append(span.to_dict())
+
+    # Export
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "time": time.time(),
+                "endpoints": {
+                    endpoint: {
+                        "statuses": {
+                            status: count for (name, status), count in self.calls.items() if name == endpoint
+                        },
+                        "retries": self.retries.get(endpoint, 0),
+                        "bytes_sent": self.bytes.get((endpoint, "sent"), 0),
+                        "bytes_received": self.bytes.get((endpoint, "received"), 0),
+                        "latency": histogram.summary(),
+                    }
+                    for endpoint, histogram in self.latency.items()
+                },
+                "spans": {name: histogram.summary() for name, histogram in self.spans.items()},
+                "traces": list(self.traces),
+            }
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def summary(metric: str, label: str, histograms: dict) -> None:
+            lines.append(f"# TYPE {metric} summary")
+            for name, histogram in histograms.items():
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{{label}="{name}",quantile="{q}"}} {histogram.percentile(q):.6f}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+
+        with self._lock:
+            lines.append("# TYPE openai_requests_total counter")
+            for (endpoint, status), count in self.calls.items():
+                lines.append(f'openai_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            lines.append("# TYPE openai_request_retries_total counter")
+            for endpoint, count in self.retries.items():
+                lines.append(f'openai_request_retries_total{{endpoint="{endpoint}"}} {count}')
+            lines.append("# TYPE openai_request_bytes_total counter")
+            for (endpoint, direction), count in self.bytes.items():
+                lines.append(
+                    f'openai_request_bytes_total{{endpoint="{endpoint}",direction="{direction}"}} {count}'
+                )
+            summary("openai_request_duration_seconds", "endpoint", self.latency)
+            summary("span_duration_seconds", "span", self.spans)
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path: str = "metrics.json", prometheus_path: str = "metrics.prom") -> None:
+        """Write both files atomically, so a scraper never reads half a file."""
+        for path, text in (
+            (json_path, json.dumps(self.snapshot(), indent=2)),
+            (prometheus_path, self.prometheus()),
+        ):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as file:
+                file.write(text)
+            os.replace(tmp_path, path)
+
+
+registry = Metrics()
+
+
+def span(name: str, **attributes) -> Span:
+    return registry.span(name, **attributes)
+
+
+# # Transport
+class _CountingStream(httpx.SyncByteStream):
+    """Response body that records the call once it has been read and closed."""
+
+    def __init__(self, stream, on_close) -> None:
+        self.stream = stream
+        self.received = 0
+        self._on_close = on_close
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.received += len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            if hasattr(self.stream, "close"):
+                self.stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close(self.received)
+                self._on_close = None
+
+
+class MetricsTransport(httpx.BaseTransport):
+    """httpx transport that records every call in a Metrics registry.
+
+    The latency runs until the response body is closed, so a streamed run is
+    timed to its last event. The call belongs to the span current when it
+    was sent, whichever thread closes the body. Retries are read from the
+    "retries" response extension set by the rate-limited transport underneath.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, metrics: Metrics = None) -> None:
+        self.transport = transport
+        self.metrics = metrics or registry
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = endpoint_name(request.method, request.url.path)
+        sent = int(request.headers.get("content-length", 0))
+        span = self.metrics.current_span()
+        start = time.perf_counter()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as e:
+            self.metrics.record_call(
+                endpoint, type(e).__name__, time.perf_counter() - start, sent=sent, span=span
+            )
+            raise
+
+        def on_close(received: int) -> None:
+            self.metrics.record_call(
+                endpoint,
+                str(response.status_code),
+                time.perf_counter() - start,
+                retries=response.extensions.get("retries", 0),
+                sent=sent,
+                received=received,
+                span=span,
+            )
+
+        response.stream = _CountingStream(response.stream, on_close)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+def _has_next_page(page) -> bool:
+    # Cursor pages only stop on an empty page; the API's has_more saves that request
+    if getattr(page, "has_more", None) is False:
+        return False
+    return page.has_next_page()
+
+
+def paginate(list_method, prefetch: bool = True, **params):
+    """Lazily yield every item of a paginated list call.
+
+    While the items of one page are being consumed, the next page is fetched
+    on a background thread, so at most two pages are held in memory at once.
+    Stopping the iteration early fetches at most one page ahead. The
+    prefetches count as calls of the span the iteration runs in.
+
+    Example:
+        for message in paginate(client.beta.threads.messages.list, thread_id=thread_id):
+            ...
+    """
+    page = list_method(**params)
+    if not prefetch:
+        while True:
+            yield from page.data
+            if not _has_next_page(page):
+                return
+            page = page.get_next_page()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        while True:
+            next_page = (
+                pool.submit(metrics.registry.propagate(page.get_next_page))
+                if _has_next_page(page)
+                else None
+            )
+            yield from page.data
+            if next_page is None:
+                return
+            page = next_page.result()
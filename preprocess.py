@@ -0,0 +1,220 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+# Extensions read as plain text; PDFs need pypdf, anything else is uploaded as is
+TEXT_EXTENSIONS = (".txt", ".md")
+
+# MinHash signature length, split into LSH bands of equal rows
+NUM_HASHES = 64
+BANDS = 16
+_PRIME = (1 << 61) - 1
+_SEEDS = [
+    (
+        int.from_bytes(hashlib.sha256(f"a{n}".encode()).digest()[:8], "big") % _PRIME | 1,
+        int.from_bytes(hashlib.sha256(f"b{n}".encode()).digest()[:8], "big") % _PRIME,
+    )
+    for n in range(NUM_HASHES)
+]
+
+
+def extract_pages(path: str):
+    """Lazily yield the text of each page of a PDF or text file.
+
+    Text files are one page per form feed. Returns None for file types that
+    cannot be read as text.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        if pypdf is None:
+            raise RuntimeError("Extracting text from PDFs needs pypdf: pip install pypdf")
+        return (page.extract_text() or "" for page in pypdf.PdfReader(path).pages)
+    if extension in TEXT_EXTENSIONS:
+        return _text_pages(path)
+    return None
+
+
+def supported(path: str) -> bool:
+    """Whether text can be extracted from the file here."""
+    extension = os.path.splitext(path)[1].lower()
+    return extension in TEXT_EXTENSIONS or (extension == ".pdf" and pypdf is not None)
+
+
+def _text_pages(path: str):
+    page = []
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            while "\f" in line:
+                before, line = line.split("\f", 1)
+                page.append(before)
+                yield "".join(page)
+                page = []
+            page.append(line)
+    yield "".join(page)
+
+
+def _split_pages(file, chunk_size: int = 1024 * 1024):
+    """Pages of a file written with a form feed after each page."""
+    buffer = ""
+    while chunk := file.read(chunk_size):
+        *pages, buffer = (buffer + chunk).split("\f")
+        yield from pages
+    if buffer:
+        yield buffer
+
+
+def _line_key(line: str) -> str:
+    # Page numbers and dates change from page to page, the header around them does not
+    return re.sub(r"\d+", "#", " ".join(line.split()).lower())
+
+
+# # MinHash
+def shingles(text: str, size: int = 5) -> set[int]:
+    words = re.findall(r"\w+", text.lower())
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[n : n + size]).encode(), digest_size=8).digest(), "big")
+        for n in range(max(1, len(words) - size + 1))
+    }
+
+
+def minhash(shingle_hashes: set[int]) -> tuple[int, ...]:
+    return tuple(min((a * h + b) % _PRIME for h in shingle_hashes) for a, b in _SEEDS)
+
+
+class MinHashIndex:
+    """Near-duplicate lookup over MinHash signatures with LSH banding."""
+
+    def __init__(self, threshold: float = 0.8) -> None:
+        self.threshold = threshold
+        self.signatures: list[tuple[int, ...]] = []
+        self._buckets: dict[tuple, list[int]] = {}
+        self._rows = NUM_HASHES // BANDS
+
+    def _bands(self, signature: tuple[int, ...]):
+        for band in range(BANDS):
+            yield (band, signature[band * self._rows : (band + 1) * self._rows])
+
+    def seen(self, signature: tuple[int, ...]) -> bool:
+        """True if a similar signature was added; otherwise adds this one."""
+        candidates = {n for key in self._bands(signature) for n in self._buckets.get(key, ())}
+        for n in candidates:
+            same = sum(x == y for x, y in zip(signature, self.signatures[n]))
+            if same / NUM_HASHES >= self.threshold:
+                return True
+        self.signatures.append(signature)
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, []).append(len(self.signatures) - 1)
+        return False
+
+
+# # Preprocessor
+class Preprocessor:
+    """Turn documents into compact text before they are uploaded.
+
+    Text is streamed out page by page. Lines repeated on most pages of a
+    document (headers, footers) are dropped, and so are paragraphs that
+    nearly repeat one already kept (shingle/MinHash). Only short paragraphs
+    of at most `boilerplate_words` (notices, disclaimers) are deduplicated
+    across the documents of the session; longer ones only within their own
+    document, so no document depends on another one for its content. A
+    report per file is kept in `reports`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        header_share: float = 0.5,
+        min_paragraph_words: int = 8,
+        boilerplate_words: int = 30,
+    ) -> None:
+        self.header_share = header_share
+        self.min_paragraph_words = min_paragraph_words
+        self.boilerplate_words = boilerplate_words
+        # Short paragraphs seen in any document of the session
+        self.paragraphs = MinHashIndex(threshold)
+        self.reports: list[dict] = []
+        self._lock = threading.Lock()
+
+    def process(self, path: str):
+        """The compact text of the file as an open temporary file, or None.
+
+        None means the original should be uploaded: the type is not
+        supported or no text came out (e.g. a scanned PDF). A file made only
+        of paragraphs seen before keeps them. The caller closes
+        the returned file, which deletes it.
+        """
+        if not supported(path):
+            return None
+        pages = extract_pages(path)
+        # Keep the pages on disk so boilerplate can be counted before writing
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as raw:
+            line_pages = Counter()
+            page_count = 0
+            for text in pages:
+                page_count += 1
+                line_pages.update({_line_key(line) for line in text.splitlines() if line.strip()})
+                raw.write(text.replace("\f", " ") + "\f")
+            repeated = {
+                key
+                for key, count in line_pages.items()
+                if page_count >= 3 and count >= max(3, self.header_share * page_count)
+            }
+            extracted = raw.tell() > page_count
+            raw.seek(0)
+            compact = tempfile.TemporaryFile("w+b")
+            report = {"path": path, "pages": page_count, "repeated_lines": 0, "duplicate_paragraphs": 0}
+            own = MinHashIndex(self.paragraphs.threshold)
+            with self._lock:
+                for page in _split_pages(raw):
+                    self._write_page(page, repeated, compact, report, own)
+            if extracted and compact.tell() == 0:
+                # Every paragraph was seen before; a file still needs some content
+                raw.seek(0)
+                report.update(repeated_lines=0, duplicate_paragraphs=0)
+                for page in _split_pages(raw):
+                    self._write_page(page, repeated, compact, report, None)
+        report["original_bytes"] = os.path.getsize(path)
+        report["text_bytes"] = compact.tell()
+        with self._lock:
+            self.reports.append(report)
+        if report["text_bytes"] == 0:
+            compact.close()
+            return None
+        compact.seek(0)
+        return compact
+
+    def take_reports(self) -> list[dict]:
+        """The reports gathered since the last call."""
+        with self._lock:
+            reports, self.reports = self.reports, []
+        return reports
+
+    def _write_page(
+        self, page: str, repeated: set[str], out, report: dict, own: MinHashIndex | None
+    ) -> None:
+        """Write the page's paragraphs; `own` holds the document's long ones, None keeps all."""
+        lines = []
+        for line in page.splitlines():
+            if _line_key(line) in repeated:
+                report["repeated_lines"] += 1
+            else:
+                lines.append(line)
+        for paragraph in re.split(r"\n\s*\n", "\n".join(lines)):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            words = len(paragraph.split())
+            if own is not None and words >= self.min_paragraph_words:
+                index = self.paragraphs if words <= self.boilerplate_words else own
+                if index.seen(minhash(shingles(paragraph))):
+                    report["duplicate_paragraphs"] += 1
+                    continue
+            out.write(paragraph.encode("utf-8") + b"\n\n")
@@ -1,11 +1,15 @@
-import time
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import cache
+import runs
+from pagination import paginate
+
 
 # Print Assistants
 def print_all_assistants(client):
-    assistants = client.beta.assistants.list()
-    for assistant in assistants.data:
+    for assistant in cache.metadata.list("assistants", client.beta.assistants.list, limit=100):
         human_time = datetime.fromtimestamp(assistant.created_at).strftime(
             "%Y-%m-%d %H:%M:%S"
         )
@@ -52,10 +56,10 @@ def print_thread(thread):
 
 # Print Messages
 def print_all_messages(client, thread_id):
+    message_counter = 0
     try:
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        message_counter = 0
-        for message in messages.data:
+        messages = paginate(client.beta.threads.messages.list, thread_id=thread_id, limit=100)
+        for message in messages:
             print(
                 f"Message {message_counter} ---> Role: {message.role}, ID: {message.id}"
             )
@@ -67,15 +71,15 @@ def print_all_messages(client, thread_id):
 
 
 def print_last_message(client, thread_id):
-    messages = client.beta.threads.messages.list(thread_id=thread_id)
-    last_message = messages.data[-1]
+    # Newest first, so the last message is the first item of the first page
+    messages = client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+    last_message = messages.data[0]
     print(last_message.content[0].text.value)
 
 
 # Print Runs
 def print_all_runs(client, thread_id):
-    runs = client.beta.threads.runs.list(thread_id=thread_id)
-    for run in runs.data:
+    for run in paginate(client.beta.threads.runs.list, thread_id=thread_id, limit=100):
         print(
             f"Run ID: {run.id}, Status: {run.status}, Assistant ID: {run.assistant_id}"
         )
@@ -83,49 +87,211 @@ def print_all_runs(client, thread_id):
 
 # Print Steps
 def print_run_steps(client, thread_id, run_id):
+    run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+    run = runs.wait_for_run(client, run, on_status=print_run_status)
+
+    run_steps = paginate(
+        client.beta.threads.runs.steps.list, thread_id=thread_id, run_id=run_id, limit=100
+    )
+    step_counter = 0
+    for step in run_steps:
+        print(
+            f"Step {step_counter} ---> ID: {step.id}, Type: {step.type}, Status: {step.status}"
+        )
+        step_counter += 1
+    print(f"Total Steps: {step_counter}")
 
-    run_steps = client.beta.threads.runs.steps.list(thread_id=thread_id, run_id=run_id)
-
-    for step in run_steps.data:
-        step_counter = 0
-        while True:
-            if step.completed_at:
-                print(f"Total Steps: {step_counter}")
-                print(
-                    f"Step {step_counter} ---> ID: {step.id}, Type: {step.type}, Status: {step.status}"
-                )
-                step_counter += 1
-                break
-            else:
-                print(f"Step ---> ID: {step.id}, Status: {step.status}")
-            time.sleep(5)
+
+def print_run_status(run):
+    print(f"Run {run.id}: {run.status}")
+
+
+def print_run_error(run):
+    if run.last_error:
+        print(f"Run {run.status}: {run.last_error.code} - {run.last_error.message}")
+    elif run.incomplete_details:
+        print(f"Run {run.status}: {run.incomplete_details.reason}")
+    else:
+        print(f"Run {run.status}, no response from the assistant.")
 
 
 # Print Response
-def print_response(client, thread_id):
-    while True:
-        time.sleep(2)
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        for message in messages.data:
-            try:
-                message.role == "assistant"
-                response = message.content[0].text.value
-                print(f"Assistant: {response}")
-                break
-            except Exception:
-                print("No response from the assistant.")
-        break
+def print_response(client, thread_id, run_id=None, after=None, streamed=""):
+    """Print the assistant messages newer than `after`, oldest first.
+
+    With run_id only that run's output is fetched. Text already printed
+    from a stream (`streamed`) is not printed again. Returns the last message
+    printed (its ID is the next cursor), or None.
+    """
+    params = {"thread_id": thread_id, "order": "asc", "limit": 100}
+    if run_id is not None:
+        params["run_id"] = run_id
+    if after is not None:
+        params["after"] = after
+
+    last_message = None
+    for message in paginate(client.beta.threads.messages.list, **params):
+        if message.role != "assistant":
+            continue
+        for content in message.content:
+            if content.type != "text":
+                continue
+            text = content.text.value
+            if streamed.startswith(text):
+                streamed = streamed[len(text) :]
+            elif streamed and text.startswith(streamed):
+                print(f"Assistant: ...{text[len(streamed) :]}")
+                streamed = ""
+            else:
+                print(f"Assistant: {text}")
+        last_message = message
+    if last_message is None:
+        print("No response from the assistant.")
+    return last_message
+
+
+def print_turn_latency(
+    first_token: float | None,
+    total: float,
+    cached: bool = False,
+    calls: int = None,
+    usage=None,
+    thread_tokens: int = None,
+) -> None:
+    calls_text = "" if calls is None else f", {calls} API call{'s' if calls != 1 else ''}"
+    if usage is not None:
+        calls_text += f", tokens: {usage.prompt_tokens} in / {usage.completion_tokens} out"
+    if thread_tokens is not None:
+        calls_text += f", thread: {thread_tokens}"
+    if cached:
+        print(f"[cached answer, turn: {total:.2f}s{calls_text}]")
+    elif first_token is None:
+        print(f"[turn: {total:.2f}s{calls_text}]")
+    else:
+        print(f"[first token: {first_token:.2f}s, turn: {total:.2f}s{calls_text}]")
+
+
+def print_budget_warning(used: int, limit: int) -> None:
+    print(f"[thread token budget exceeded: {used} of {limit} tokens used]")
+
+
+def print_budget_rotated(used: int, limit: int, thread_id: str) -> None:
+    print(f"[thread used {used} of {limit} tokens, continuing on a new thread. ID: {thread_id}]")
+
+
+def print_trace(span) -> None:
+    """One line with the time spent in each step of a traced turn."""
+    steps = ", ".join(
+        f"{child.name} {child.duration:.2f}s ({len(child.calls)} calls)" for child in span.children
+    )
+    if steps:
+        print(f"[{steps}]")
+
+
+# Print Bulk Operations
+def print_progress(title: str, done: int, total: int) -> None:
+    """Progress counter rewritten in place; ends the line when done."""
+    print(f"\r{title}: {done}/{total}", end="\n" if done >= total else "", flush=True)
+
+
+def print_bulk_result(result, title: str) -> None:
+    print(f"{title}: {result}")
+    for item_id, error in result.failed.items():
+        print(f"  {item_id} failed: {error}")
+
+
+def print_upload_result(result: dict) -> None:
+    print(
+        f"Uploaded: {len(result['uploaded'])}, "
+        f"Attached: {len(result['attached'])}, "
+        f"Skipped (already in vector store): {len(result['skipped'])}, "
+        f"Failed: {len(result['failed'])}"
+    )
+    for path, error in result["failed"].items():
+        print(f"  {path} failed: {error}")
+
+
+def print_ingest_status(status: dict) -> None:
+    """One status line for the background ingestion queue."""
+    steps = ", ".join(
+        f"{status[key]} {key}" for key in ("queued", "uploading", "indexing") if status[key]
+    )
+    done = f"{status['ready']} ready" + (f", {status['failed']} failed" if status["failed"] else "")
+    if steps:
+        print(f"[files: {steps}; {done}]")
+    elif status["ready"] or status["failed"]:
+        print(f"[files: all indexed; {done}]")
+
+
+def print_preprocess_reports(reports: list[dict]) -> None:
+    """Bytes saved by uploading compact text, per file and in total."""
+    if not reports:
+        return
+    original = sum(report["original_bytes"] for report in reports)
+    text = sum(report["text_bytes"] or report["original_bytes"] for report in reports)
+    print(f"Preprocessed {len(reports)} files: {original} -> {text} bytes ({original - text} saved)")
+    for report in reports:
+        if not report["text_bytes"]:
+            print(f"  {report['path']}: no text found, uploaded as is")
+            continue
+        saved = report["original_bytes"] - report["text_bytes"]
+        print(
+            f"  {report['path']}: {report['original_bytes']} -> {report['text_bytes']} bytes "
+            f"({saved / report['original_bytes']:.0%} saved), "
+            f"{report['repeated_lines']} repeated lines, "
+            f"{report['duplicate_paragraphs']} duplicate paragraphs dropped"
+        )
+
+
+# Print Cache
+def print_cache_stats(metadata_cache) -> None:
+    hits = sum(metadata_cache.hits.values())
+    misses = sum(metadata_cache.misses.values())
+    per_kind = ", ".join(
+        f"{kind}: {metadata_cache.hits[kind]}/{metadata_cache.hits[kind] + metadata_cache.misses[kind]}"
+        for kind in metadata_cache.hits
+        if metadata_cache.hits[kind] or metadata_cache.misses[kind]
+    )
+    print(
+        f"Metadata cache: {hits} hits, {misses} misses "
+        f"({metadata_cache.hit_rate():.0%} hit rate)" + (f" [{per_kind}]" if per_kind else "")
+    )
+
+
+def print_rate_limit_stats(stats: dict) -> None:
+    print(
+        f"API requests: {stats['requests']}, retries: {stats['retries']}, "
+        f"throttled: {stats['throttled']}, waited for budget: {stats['waited']:.1f}s"
+    )
+
+
+def print_hedge_stats(tracker) -> None:
+    print(
+        f"Hedging: fired on {tracker.fired} of {tracker.turns} turns, "
+        f"won {tracker.won}, at least {tracker.saved:.2f}s saved"
+    )
+
+
+def print_answer_cache_stats(answer_cache) -> None:
+    print(
+        f"Answer cache: {answer_cache.hits} hits, {answer_cache.misses} misses "
+        f"({answer_cache.hit_rate():.0%} hit rate)"
+    )
+
+
+def print_batch_result(result: dict, results_path: str) -> None:
+    print(
+        f"\nBatch: {result['completed']} answered, {result['cached']} from cache, "
+        f"{result['failed']} failed, {result['skipped']} already done "
+        f"in {result['elapsed_s']:.1f}s ({result['total_tokens']} tokens)"
+    )
+    print(f"Results: {results_path}")
 
 
 # Print Files
 def list_files(client):
     files_list = []
-    if not client.files.list().data:
-        print("No files found.")
-        return
-
-    files = client.files.list()
-    for counter, file in enumerate(files.data, start=1):
+    for file in cache.metadata.list("files", client.files.list):
         file_info = {
             "id": file.id,
             "filename": file.filename,
@@ -134,6 +300,10 @@ def list_files(client):
             "status": file.status,
         }
         files_list.append(file_info)
+    if not files_list:
+        print("No files found.")
+        return
+
     print(
         f"\nTotal Files: {len(files_list)}",
         "-" * (100 - (len("Total Files:  ") + len(str(len(files_list))))),
@@ -156,57 +326,112 @@ def list_files(client):
 
 # Print User Files and Folders
 def list_user_files(extension_list: list[str] = ['.pdf']) -> list[str]:
-    user_files_list = []
+    user_files_list = sorted(
+        entry.name
+        for entry in os.scandir(".")
+        if entry.is_file() and os.path.splitext(entry.name)[1].lower() in extension_list
+    )
     return user_files_list
 
 
 def list_user_folders() -> list[str]:
-    user_folders_list = []
+    user_folders_list = sorted(
+        entry.name
+        for entry in os.scandir(".")
+        if entry.is_dir() and not entry.name.startswith((".", "__"))
+    )
     return user_folders_list
 
 
 def print_files_and_folders(user_files_list: list[str], user_folders_list: list[str]) -> None:
-    ...
-    pass
+    if user_files_list:
+        print(f"\nFiles: {', '.join(user_files_list)}")
+    if user_folders_list:
+        print(f"Folders: {', '.join(user_folders_list)}")
+    print("")
+
+
+def print_sync_plan(plan) -> None:
+    print(
+        f"\nSync plan for \"{plan.root}\" -> {plan.vector_store_id}\n" + "-" * 60
+    )
+    for path in plan.add:
+        print(f"  + {path}")
+    for path in plan.update:
+        replaced = plan.remove.get(path)
+        print(f"  ~ {path}" + (f" (replaces {replaced})" if replaced else ""))
+    removed = {path: file_id for path, file_id in plan.remove.items() if path not in plan.update}
+    for path, file_id in removed.items():
+        print(f"  - {path} ({file_id})")
+    print(
+        f"{len(plan.add)} to add, {len(plan.update)} to update, "
+        f"{len(removed)} to remove, {plan.unchanged} unchanged.\n"
+    )
 
 
 # Print Vector Stores
 def list_vector_stores(client) -> list[str]:
     vector_stores_list = []
-    vector_stores = client.beta.vector_stores.list()
-    for vector_store in vector_stores.data:
+    for vector_store in cache.metadata.list(
+        "vector_stores", client.beta.vector_stores.list, limit=100
+    ):
         print(f"ID: {vector_store.id}")
         vector_stores_list.append(vector_store.id)
     return vector_stores_list
 
 
 # Print Vector Store Files
-def print_vs_n_files(client, vector_store):
-    print(f"\nID: {vector_store.id}, Name: {vector_store.name}, "
-          + f"Usage Bytes: {vector_store.usage_bytes}, "
-          + f"Status: {vector_store.status},\n"
-          + f"File Counts: {vector_store.file_counts}\n"
-          + f"Expires After: {vector_store.expires_after}, "
-          + f"Expires At: {vector_store.expires_at}, "
-          + f"Last Active: {vector_store.last_active_at}")
-    vs_files = client.beta.vector_stores.files.list(
-        vector_store_id=vector_store.id
-    )
-    print(f"Total Files: {len(vs_files.data)}")
-    for vs_file in vs_files.data:
+def print_vs_n_files(vector_store, vs_files: list, filenames: dict, number: int = None) -> None:
+    prefix = f"[{number}] " if number is not None else ""
+    print(
+        f"\n{prefix}ID: {vector_store.id}, Name: {vector_store.name}, "
+        + f"Usage Bytes: {vector_store.usage_bytes}, "
+        + f"Status: {vector_store.status},\n"
+        + f"File Counts: {vector_store.file_counts}\n"
+        + f"Expires After: {vector_store.expires_after}, "
+        + f"Expires At: {vector_store.expires_at}, "
+        + f"Last Active: {vector_store.last_active_at}"
+    )
+    print(
+        f"Total Files: {len(vs_files)}\n"
+        + f'{"No.":<5}{"Filename":<30}{"ID":<32}{"Usage Bytes":<14}{"Status":<12}'
+        + "\n" + "-" * 93
+    )
+    for i, vs_file in enumerate(vs_files, start=1):
+        filename = filenames.get(vs_file.id, "(deleted file)")
         print(
-            f"ID: {vs_file.id}, bytes: {vs_file.usage_bytes}, status: {vs_file.status}"
+            f"{i:<5}{filename[:29]:<30}{vs_file.id:<32}"
+            + f"{vs_file.usage_bytes:<14}{vs_file.status:<12}"
         )
 
 
-def list_vs_n_files(client, vector_stores=None) -> None:
-    # vs_n_files_list = []
+def list_vs_n_files(client, vector_stores=None, workers: int = 8) -> list:
+    """Print one report of vector stores and their files.
+
+    The per-store file listings and the file name lookup run concurrently on
+    at most `workers` threads. Returns the vector stores in report order.
+    """
     if vector_stores is None:
-        vector_stores = client.beta.vector_stores.list()
-        for vector_store in vector_stores:
-            print_vs_n_files(client, vector_store)
-        return
+        stores = cache.metadata.list("vector_stores", client.beta.vector_stores.list, limit=100)
     else:
-        print_vs_n_files(client, vector_stores)
+        stores = [vector_stores]
 
-    return None
+    def list_store_files(vector_store):
+        return cache.vector_store_files(client, vector_store.id)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        filenames = pool.submit(
+            lambda: {file.id: file.filename for file in cache.metadata.list("files", client.files.list)}
+        )
+        store_files = list(pool.map(list_store_files, stores))
+
+    for number, (vector_store, vs_files) in enumerate(zip(stores, store_files), start=1):
+        print_vs_n_files(
+            vector_store,
+            vs_files,
+            filenames.result(),
+            number if vector_stores is None else None,
+        )
+    if vector_stores is None:
+        print(f"\n--- Total Vector Stores: {len(stores)} ---")
+    return stores
@@ -0,0 +1,223 @@
+import re
+import threading
+import time
+
+import httpx
+from openai import DefaultHttpxClient, OpenAI
+
+from metrics import MetricsTransport
+from runs import Backoff
+
+# Statuses worth another attempt
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Counters shared by every rate-limited client
+stats = {"requests": 0, "retries": 0, "throttled": 0, "waited": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, amount=1) -> None:
+    with _stats_lock:
+        stats[name] += amount
+
+
+def parse_duration(value: str) -> float:
+    """Seconds in a rate limit reset header such as "1s", "6m0s" or "20ms"."""
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(
+        float(number) * units[unit]
+        for number, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value or "")
+    )
+
+
+# # Token Bucket
+class TokenBucket:
+    """Thread-safe token bucket; without a rate it never blocks.
+
+    The rate and capacity are set up front or learned from the
+    x-ratelimit-* headers of the responses through update().
+    """
+
+    def __init__(self, rate: float = None, capacity: float = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Take amount tokens, sleeping until they are available; returns the wait."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                # Anything bigger than the whole bucket goes through once it is full
+                if not self.rate or self.tokens >= min(amount, self.capacity):
+                    if self.rate:
+                        self.tokens -= amount
+                    return waited
+                delay = (min(amount, self.capacity) - self.tokens) / self.rate
+            delay = min(delay, 1.0)
+            time.sleep(delay)
+            waited += delay
+
+    def update(self, limit: float, remaining: float, reset: float) -> None:
+        """Align the bucket with what the server reports."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if reset > 0 and limit > remaining:
+                # The server refills the used part of the budget within `reset`
+                self.rate = (limit - remaining) / reset
+            elif not self.rate:
+                self.rate = limit / 60.0
+            self.capacity = limit
+            self.tokens = min(self.tokens if self.tokens is not None else limit, remaining)
+
+
+# # Transport
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport that paces requests and retries throttled ones.
+
+    Requests wait for the request bucket, and run creations also for the token
+    bucket, whose budgets come from the x-ratelimit-* response headers (or the
+    configured per-minute limits). 429 and 5xx responses and connection errors
+    are retried with backoff, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport = None,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        retries: int = 4,
+        backoff: Backoff = None,
+    ) -> None:
+        self.transport = transport or httpx.HTTPTransport(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        self.requests = TokenBucket(
+            requests_per_minute and requests_per_minute / 60.0, requests_per_minute
+        )
+        self.tokens = TokenBucket(tokens_per_minute and tokens_per_minute / 60.0, tokens_per_minute)
+        self.retries = retries
+        self.backoff = backoff or Backoff(initial=0.5, maximum=20.0)
+
+    def _estimated_tokens(self, request: httpx.Request) -> int:
+        # Only runs spend model tokens; the real usage is synced from the headers
+        if request.method != "POST" or not request.url.path.endswith("/runs"):
+            return 0
+        return max(int(request.headers.get("content-length", 0)) // 4, 1)
+
+    def _update(self, headers: httpx.Headers) -> None:
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if limit is None or remaining is None:
+                continue
+            try:
+                bucket.update(
+                    float(limit),
+                    float(remaining),
+                    parse_duration(headers.get(f"x-ratelimit-reset-{kind}")),
+                )
+            except ValueError:
+                continue
+
+    def _retry_after(self, response: httpx.Response, attempt: int) -> float:
+        delay = self.backoff.delay(attempt)
+        try:
+            if "retry-after-ms" in response.headers:
+                delay = max(delay, float(response.headers["retry-after-ms"]) / 1000)
+            elif "retry-after" in response.headers:
+                delay = max(delay, float(response.headers["retry-after"]))
+        except ValueError:
+            pass
+        return min(delay, 60.0)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            waited = self.requests.acquire()
+            tokens = self._estimated_tokens(request)
+            if tokens:
+                waited += self.tokens.acquire(tokens)
+            if waited:
+                _count("waited", waited)
+            _count("requests")
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.ConnectError:
+                if attempt >= self.retries:
+                    raise
+                delay = self.backoff.delay(attempt)
+            else:
+                self._update(response.headers)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.extensions["retries"] = attempt
+                    return response
+                if response.status_code == 429:
+                    _count("throttled")
+                delay = self._retry_after(response, attempt)
+                response.close()
+            _count("retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def make_client(api_key: str, **transport_options) -> OpenAI:
+    """OpenAI client whose requests all go through a RateLimitedTransport.
+
+    The SDK's own retries are turned off so that each request is retried in
+    one place only. Every call is recorded in the metrics registry.
+    """
+    transport = MetricsTransport(RateLimitedTransport(**transport_options))
+    return OpenAI(
+        api_key=api_key,
+        max_retries=0,
+        http_client=DefaultHttpxClient(transport=transport),
+    )
+
+
+# # Adaptive Concurrency
+class AdaptiveLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease.
+
+    Used as a context manager around each unit of work of a bulk operation.
+    Every finished unit raises the limit by about one per limit's worth of
+    work, and halves it if a request was throttled (429) since the last
+    decrease.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, initial: int = None) -> None:
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial or maximum)
+        self._active = 0
+        self._seen = stats["throttled"]
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self._active >= int(self.limit):
+                self._condition.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        with self._condition:
+            self._active -= 1
+            throttled = stats["throttled"]
+            if throttled > self._seen:
+                self._seen = throttled
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
@@ -0,0 +1,81 @@
+import json
+
+# Settings a vector store (or the "default" section) may have
+KEYS = ("max_chunk_size_tokens", "chunk_overlap_tokens", "max_num_results")
+
+
+def validate(values: dict) -> None:
+    """Raise ValueError for settings the API would reject."""
+    unknown = set(values) - set(KEYS)
+    if unknown:
+        raise ValueError(f"Unknown retrieval settings: {', '.join(sorted(unknown))}")
+    size = values.get("max_chunk_size_tokens")
+    overlap = values.get("chunk_overlap_tokens")
+    if size is not None and not 100 <= size <= 4096:
+        raise ValueError("max_chunk_size_tokens must be between 100 and 4096")
+    if (size is None) != (overlap is None):
+        raise ValueError("max_chunk_size_tokens and chunk_overlap_tokens go together")
+    if overlap is not None and not 0 <= overlap <= size // 2:
+        raise ValueError("chunk_overlap_tokens must be between 0 and half the chunk size")
+    results = values.get("max_num_results")
+    if results is not None and not 1 <= results <= 50:
+        raise ValueError("max_num_results must be between 1 and 50")
+
+
+def file_search_tool(max_num_results: int = None) -> dict:
+    if max_num_results is None:
+        return {"type": "file_search"}
+    return {"type": "file_search", "file_search": {"max_num_results": max_num_results}}
+
+
+# # Settings
+class RetrievalSettings:
+    """Chunking and file_search settings per vector store.
+
+    Read from a JSON file shaped like
+    {"default": {...}, "vector_stores": {vector_store_id: {...}}} with the
+    KEYS above; a vector store's settings override the defaults, and
+    anything unset keeps the API default. The file is optional.
+    """
+
+    def __init__(self, path: str = "retrieval.json") -> None:
+        self.path = path
+        try:
+            with open(path, "r") as file:
+                config = json.load(file)
+        except FileNotFoundError:
+            config = {}
+        self.default: dict = config.get("default", {})
+        self.vector_stores: dict[str, dict] = config.get("vector_stores", {})
+        validate(self.default)
+        for values in self.vector_stores.values():
+            validate({**self.default, **values})
+
+    def get(self, vector_store_id: str = None) -> dict:
+        return {**self.default, **self.vector_stores.get(vector_store_id, {})}
+
+    def set(self, vector_store_id: str, **values) -> None:
+        """Override a vector store's settings for this session."""
+        validate({**self.get(vector_store_id), **values})
+        self.vector_stores.setdefault(vector_store_id, {}).update(values)
+
+    def chunking_options(self, vector_store_id: str) -> dict:
+        """chunking_strategy kwargs for attaching files to the vector store."""
+        values = self.get(vector_store_id)
+        if values.get("max_chunk_size_tokens") is None:
+            return {}
+        return {
+            "chunking_strategy": {
+                "type": "static",
+                "static": {
+                    "max_chunk_size_tokens": values["max_chunk_size_tokens"],
+                    "chunk_overlap_tokens": values["chunk_overlap_tokens"],
+                },
+            }
+        }
+
+    def file_search_tool(self, vector_store_id: str = None) -> dict:
+        return file_search_tool(self.get(vector_store_id).get("max_num_results"))
+
+
+settings = RetrievalSettings()
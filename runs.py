@@ -0,0 +1,146 @@
+import heapq
+import itertools
+import random
+import time
+
+# Statuses a run never leaves
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled", "expired", "incomplete"})
+# Statuses the waiter stops on (requires_action needs the caller to submit tool outputs)
+STOP_STATUSES = TERMINAL_STATUSES | {"requires_action"}
+
+
+# # Backoff
+class Backoff:
+    """Exponential backoff with jitter for polling intervals."""
+
+    def __init__(
+        self,
+        initial: float = 0.25,
+        maximum: float = 4.0,
+        factor: float = 1.6,
+        jitter: float = 0.3,
+    ) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        base = min(self.maximum, self.initial * self.factor**attempt)
+        return base * random.uniform(1 - self.jitter, 1)
+
+
+# # Run Waiter
+class RunWaiter:
+    """Wait on one or many runs from a single polling scheduler.
+
+    Every run gets its own backoff schedule; the scheduler always sleeps until
+    the next run is due, so N runs cost one thread and no busy loop. A run whose
+    deadline passes is cancelled and returned as it is at that moment.
+    """
+
+    def __init__(self, client, backoff: Backoff = None, on_status=None) -> None:
+        self.client = client
+        self.backoff = backoff or Backoff()
+        self.on_status = on_status
+        self._queue = []
+        self._pending = {}
+        self._counter = itertools.count()
+
+    def add(self, run, timeout: float = None) -> None:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self._pending[run.id] = {
+            "run": run,
+            "status": None,
+            "attempt": 0,
+            "deadline": deadline,
+        }
+        heapq.heappush(self._queue, (time.monotonic(), next(self._counter), run.id))
+
+    def wait_first(self, until: float = None):
+        """Block until one added run stops and return it.
+
+        Returns None once `until` (a time.monotonic() value) passes or when no
+        run is pending; the remaining runs stay scheduled.
+        """
+        while self._queue:
+            due, _, run_id = self._queue[0]
+            now = time.monotonic()
+            if until is not None and now >= until:
+                return None
+            if due > now:
+                time.sleep((due if until is None else min(due, until)) - now)
+                continue
+            heapq.heappop(self._queue)
+            entry = self._pending[run_id]
+
+            if entry["deadline"] is not None and now >= entry["deadline"]:
+                del self._pending[run_id]
+                return self._cancel(entry["run"])
+
+            if entry["attempt"]:
+                entry["run"] = self._retrieve(entry["run"])
+            run = entry["run"]
+            if run.status != entry["status"] and self.on_status:
+                self.on_status(run)
+            entry["status"] = run.status
+
+            if run.status in STOP_STATUSES:
+                return self._pending.pop(run_id)["run"]
+
+            next_poll = now + self.backoff.delay(entry["attempt"])
+            if entry["deadline"] is not None:
+                next_poll = min(next_poll, entry["deadline"])
+            entry["attempt"] += 1
+            heapq.heappush(self._queue, (next_poll, next(self._counter), run_id))
+        return None
+
+    def wait_all(self) -> dict:
+        """Block until every added run stops; returns {run_id: run}."""
+        done = {}
+        while True:
+            run = self.wait_first()
+            if run is None:
+                return done
+            done[run.id] = run
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def discard(self, run_id: str) -> None:
+        """Stop polling a run."""
+        self._pending.pop(run_id, None)
+        self._queue = [item for item in self._queue if item[2] != run_id]
+        heapq.heapify(self._queue)
+
+    def wait(self, run, timeout: float = None):
+        self.add(run, timeout)
+        return self.wait_all()[run.id]
+
+    def _retrieve(self, run):
+        return self.client.beta.threads.runs.retrieve(
+            thread_id=run.thread_id, run_id=run.id
+        )
+
+    def _cancel(self, run):
+        try:
+            run = self.client.beta.threads.runs.cancel(
+                thread_id=run.thread_id, run_id=run.id
+            )
+        except Exception:
+            # The run may have finished between the last poll and the cancel
+            run = self._retrieve(run)
+        if self.on_status:
+            self.on_status(run)
+        return run
+
+
+def wait_for_run(client, run, timeout: float = None, on_status=None):
+    return RunWaiter(client, on_status=on_status).wait(run, timeout)
+
+
+def wait_for_runs(client, runs: list, timeout: float = None, on_status=None) -> dict:
+    waiter = RunWaiter(client, on_status=on_status)
+    for run in runs:
+        waiter.add(run, timeout)
+    return waiter.wait_all()
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+
+# # Timings
+class StartupTimings:
+    """Per-step wall times of the startup path, printed and appended to a log."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.steps: dict[str, float] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.steps[name] = seconds
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def report(self) -> None:
+        print(f"\n{'Startup step':<30}{'Seconds':>10}\n" + "-" * 40)
+        for name, seconds in self.steps.items():
+            print(f"{name:<30}{seconds:>10.3f}")
+        print("-" * 40 + f"\n{'Total':<30}{self.total():>10.3f}\n")
+
+    def save(self, path: str = "startup_timings.jsonl") -> None:
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "total": round(self.total(), 4),
+            "steps": {name: round(seconds, 4) for name, seconds in self.steps.items()},
+        }
+        with open(path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+
+
+# # Lookups
+async def _timed(timings: StartupTimings, name: str, coro):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings.record(name, time.perf_counter() - start)
+
+
+async def lookup_resources(
+    api_key: str,
+    assistant_id: str,
+    vector_store_id: str,
+    thread_id: str,
+    timings: StartupTimings,
+    transport: httpx.AsyncBaseTransport = None,
+) -> dict:
+    """Retrieve the saved resources concurrently.
+
+    Returns a dict with "assistant", "vector_store", "thread" and "models"; a
+    resource that could not be retrieved is None. Models are only listed when
+    there is no saved resource to look up, since then the key still has to be
+    validated. Any error other than "not found" is raised. A transport (e.g.
+    a cassette) replaces the default one.
+    """
+    lookups = {}
+    http_client = DefaultAsyncHttpxClient(transport=transport) if transport else None
+    async with AsyncOpenAI(api_key=api_key, http_client=http_client) as aclient:
+        if assistant_id:
+            lookups["assistant"] = _timed(
+                timings, "assistants.retrieve", aclient.beta.assistants.retrieve(assistant_id)
+            )
+        if vector_store_id:
+            lookups["vector_store"] = _timed(
+                timings,
+                "vector_stores.retrieve",
+                aclient.beta.vector_stores.retrieve(vector_store_id),
+            )
+        if thread_id:
+            lookups["thread"] = _timed(
+                timings, "threads.retrieve", aclient.beta.threads.retrieve(thread_id)
+            )
+        if not lookups:
+            lookups["models"] = _timed(timings, "models.list", aclient.models.list())
+        results = await asyncio.gather(*lookups.values(), return_exceptions=True)
+
+    resources = {"assistant": None, "vector_store": None, "thread": None, "models": None}
+    for name, result in zip(lookups, results):
+        # Only a missing resource is reported as None; rate limits and outages
+        # must not look like "not found" and lead to creating a new one
+        if isinstance(result, BaseException) and not isinstance(result, openai.NotFoundError):
+            raise result
+        if not isinstance(result, BaseException):
+            resources[name] = result
+    return resources
+
+
+def validate_in_background(
+    api_key: str, assistant_id: str, vector_store_id: str, thread_id: str, transport=None
+) -> threading.Thread:
+    """Check the saved resources without blocking; warn if any is gone."""
+
+    def validate():
+        try:
+            resources = asyncio.run(
+                lookup_resources(
+                    api_key, assistant_id, vector_store_id, thread_id, StartupTimings(), transport
+                )
+            )
+        except Exception as e:
+            print(f"\nWarning: could not validate the saved resources: {str(e)}")
+            return
+        missing = [name for name in ("assistant", "vector_store", "thread") if resources[name] is None]
+        if missing:
+            print(
+                f"\nWarning: saved {', '.join(missing)} NOT found. "
+                "Restart without --resume to recreate them."
+            )
+
+    thread = threading.Thread(target=validate, daemon=True)
+    thread.start()
+    return thread
+
+
+def startup(
+    api_key: str,
+    assistant_id: str,
+    vector_store_id: str,
+    thread_id: str,
+    timings: StartupTimings,
+    transport=None,
+) -> dict:
+    with timings.measure("lookups (concurrent)"):
+        return asyncio.run(
+            lookup_resources(api_key, assistant_id, vector_store_id, thread_id, timings, transport)
+        )
@@ -0,0 +1,112 @@
+import json
+import os
+from dataclasses import dataclass, field
+
+import cache
+from uploads import file_hash
+
+
+def walk_files(root: str, extensions: list[str] = None):
+    """Lazily yield file paths under root, skipping hidden files and folders."""
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path, extensions)
+            elif entry.is_file():
+                if extensions is None or os.path.splitext(entry.name)[1].lower() in extensions:
+                    yield entry.path
+
+
+# # Sync State
+class SyncState:
+    """Last synced snapshot per vector store and folder.
+
+    Stored as {vector_store_id: {folder: {relative_path: entry}}} where an entry
+    holds the size, mtime, content hash and file ID of the synced file.
+    """
+
+    def __init__(self, path: str = ".sync_state.json") -> None:
+        self.path = path
+        try:
+            with open(path, "r") as file:
+                self.stores: dict[str, dict] = json.load(file)
+        except FileNotFoundError:
+            self.stores = {}
+
+    def get(self, vector_store_id: str, root: str) -> dict:
+        return self.stores.get(vector_store_id, {}).get(os.path.abspath(root), {})
+
+    def set(self, vector_store_id: str, root: str, entries: dict) -> None:
+        self.stores.setdefault(vector_store_id, {})[os.path.abspath(root)] = entries
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.stores, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class SyncPlan:
+    root: str
+    vector_store_id: str
+    add: list[str] = field(default_factory=list)
+    update: list[str] = field(default_factory=list)
+    remove: dict[str, str] = field(default_factory=dict)
+    unchanged: int = 0
+    entries: dict[str, dict] = field(default_factory=dict)
+
+    def is_empty(self) -> bool:
+        return not (self.add or self.update or self.remove)
+
+
+def plan_sync(
+    client,
+    root: str,
+    vector_store_id: str,
+    state: SyncState,
+    extensions: list[str] = None,
+) -> SyncPlan:
+    """Compare a local folder with what was last synced to the vector store.
+
+    Files are only re-hashed when their size or mtime changed, so planning a
+    folder of thousands of unchanged files costs one stat per file plus the
+    vector store file listing.
+    """
+    vs_file_ids = {vs_file.id for vs_file in cache.vector_store_files(client, vector_store_id)}
+    previous = state.get(vector_store_id, root)
+    plan = SyncPlan(root=root, vector_store_id=vector_store_id)
+
+    for path in walk_files(root, extensions):
+        relative_path = os.path.relpath(path, root)
+        stat = os.stat(path)
+        old = previous.get(relative_path)
+        if old and old["bytes"] == stat.st_size and old["mtime"] == stat.st_mtime_ns:
+            digest = old["sha256"]
+        else:
+            digest = file_hash(path)
+        plan.entries[relative_path] = {
+            "bytes": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha256": digest,
+            "file_id": old["file_id"] if old and old["sha256"] == digest else None,
+        }
+
+        if old is None:
+            plan.add.append(relative_path)
+        elif old["sha256"] != digest:
+            plan.update.append(relative_path)
+            if old["file_id"] in vs_file_ids:
+                plan.remove[relative_path] = old["file_id"]
+        elif old["file_id"] not in vs_file_ids:
+            # Synced before but detached since: attach it again
+            plan.add.append(relative_path)
+        else:
+            plan.unchanged += 1
+
+    for relative_path, old in previous.items():
+        if relative_path not in plan.entries and old["file_id"] in vs_file_ids:
+            plan.remove[relative_path] = old["file_id"]
+    return plan
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import threading
+
+import openai
+
+import bulk
+import cache
+import preprocess
+import retrieval
+from pagination import paginate
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of the file contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_key(digest: str, path: str, preprocessor=None) -> str:
+    """The upload index key of a file as it would be uploaded.
+
+    Files a preprocessor turns into text are indexed apart from the
+    original documents, so turning preprocessing on or off uploads them again.
+    """
+    if preprocessor is not None and preprocess.supported(path):
+        return f"{digest}:text"
+    return digest
+
+
+# # Upload Index
+class UploadIndex:
+    """Persistent index key (see index_key) -> uploaded file mapping."""
+
+    def __init__(self, path: str = ".upload_index.json") -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as file:
+                self.entries: dict[str, dict] = json.load(file)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def get(self, digest: str) -> dict | None:
+        with self._lock:
+            return self.entries.get(digest)
+
+    def add(self, digest: str, file_id: str, path: str, size: int) -> None:
+        with self._lock:
+            self.entries[digest] = {
+                "file_id": file_id,
+                "filename": os.path.basename(path),
+                "bytes": size,
+            }
+
+    def remove_file_id(self, file_id: str) -> None:
+        with self._lock:
+            for digest in [d for d, e in self.entries.items() if e["file_id"] == file_id]:
+                del self.entries[digest]
+
+    def save(self) -> None:
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self.entries, file, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+# # Uploads
+def _file_exists(client, file_id: str) -> bool:
+    try:
+        client.files.retrieve(file_id)
+        return True
+    except openai.NotFoundError:
+        return False
+
+
+def plan_uploads(
+    client,
+    paths: list[str],
+    vector_store_id: str,
+    index: UploadIndex,
+    digests: dict[str, str] = None,
+    preprocessor=None,
+) -> tuple[dict[str, str], list[str], list[str]]:
+    """Sort paths into files to upload, known files to attach and skipped ones.
+
+    Files are hashed locally (unless `digests` has them) and looked up in the
+    upload index as they would be uploaded with `preprocessor`. Returns
+    ({path: sha256} to upload, file IDs to attach, skipped paths).
+    """
+    vs_file_ids = {vs_file.id for vs_file in cache.vector_store_files(client, vector_store_id)}
+
+    to_upload = {}
+    queued = set()
+    to_attach = []
+    skipped = []
+    for path in paths:
+        digest = digests[path] if digests and path in digests else file_hash(path)
+        key = index_key(digest, path, preprocessor)
+        entry = index.get(key)
+        if key in queued or (entry and entry["file_id"] in vs_file_ids):
+            skipped.append(path)
+        elif entry and _file_exists(client, entry["file_id"]):
+            to_attach.append(entry["file_id"])
+        else:
+            to_upload[path] = digest
+        queued.add(key)
+    return to_upload, to_attach, skipped
+
+
+def upload_file(client, path: str, digest: str, index: UploadIndex, preprocessor=None) -> str:
+    """Upload one file, holding a single open handle; returns its file ID.
+
+    With a preprocessor the file's compact text is uploaded in its place when
+    text can be extracted from it. The index keeps the original's hash, keyed
+    by whether it went through the preprocessor (see index_key).
+    """
+    compact = preprocessor.process(path) if preprocessor is not None else None
+    if compact is not None:
+        with compact:
+            uploaded = client.files.create(
+                file=(os.path.splitext(os.path.basename(path))[0] + ".txt", compact), purpose="assistants"
+            )
+    else:
+        with open(path, "rb") as file:
+            uploaded = client.files.create(file=file, purpose="assistants")
+    index.add(index_key(digest, path, preprocessor), uploaded.id, path, uploaded.bytes)
+    return uploaded.id
+
+
+def attach_files(
+    client,
+    file_ids: list[str],
+    vector_store_id: str,
+    chunk_size: int = 500,
+    workers: int = 4,
+    on_done=None,
+) -> bulk.BulkResult:
+    """Attach files to a vector store with one file batch per `chunk_size` files.
+
+    Files are chunked as configured for the vector store. The batches run
+    concurrently; files the vector store could not index are reported as
+    failed. The files of a batch the API rejected are attached one at a time,
+    so only the files at fault fail. on_done(file_ids) is called as files finish.
+    """
+    chunks = {
+        str(n): file_ids[start : start + chunk_size]
+        for n, start in enumerate(range(0, len(file_ids), chunk_size))
+    }
+    chunking = retrieval.settings.chunking_options(vector_store_id)
+    failed = {}
+    attached = []
+
+    def attach(chunk_id):
+        batch = client.beta.vector_stores.file_batches.create_and_poll(
+            vector_store_id=vector_store_id, file_ids=chunks[chunk_id], **chunking
+        )
+        errors = {}
+        if batch.file_counts.failed or batch.file_counts.cancelled:
+            for vs_file in paginate(
+                client.beta.vector_stores.file_batches.list_files,
+                batch_id=batch.id,
+                vector_store_id=vector_store_id,
+                filter="failed",
+                limit=100,
+            ):
+                if vs_file.status == "failed":
+                    errors[vs_file.id] = vs_file.last_error.message if vs_file.last_error else "failed"
+        failed.update(errors)
+        attached.extend(file_id for file_id in chunks[chunk_id] if file_id not in errors)
+
+    def attach_one(file_id):
+        vs_file = client.beta.vector_stores.files.create_and_poll(
+            file_id=file_id, vector_store_id=vector_store_id, **chunking
+        )
+        if vs_file.status == "failed":
+            failed[file_id] = vs_file.last_error.message if vs_file.last_error else "failed"
+        else:
+            attached.append(file_id)
+
+    def progress(done_ids, error):
+        if on_done is not None and error is None:
+            on_done(done_ids)
+
+    result = bulk.bulk_apply(
+        list(chunks),
+        attach,
+        workers=workers,
+        on_done=lambda chunk_id, error: progress(chunks[chunk_id], error),
+    )
+    retry = [file_id for chunk_id in result.failed for file_id in chunks[chunk_id]]
+    if retry:
+        single = bulk.bulk_apply(
+            retry,
+            attach_one,
+            workers=workers,
+            on_done=lambda file_id, error: progress([file_id], None),
+        )
+        failed.update(single.failed)
+        result.elapsed += single.elapsed
+    cache.metadata.invalidate("vector_stores")
+    result.done = attached
+    result.failed = failed
+    return result
+
+
+def upload_new_files(
+    client,
+    paths: list[str],
+    vector_store_id: str,
+    index: UploadIndex = None,
+    workers: int = 4,
+    digests: dict[str, str] = None,
+    preprocessor=None,
+) -> dict:
+    """Upload only the files whose contents the vector store does not have yet.
+
+    Known files that are missing from the vector store are attached without
+    re-uploading (see plan_uploads). New files are uploaded by at most
+    `workers` threads and everything is attached with attach_files; files
+    that fail to upload or to be indexed are in "failed".
+
+    Pass `digests` ({path: sha256}) to reuse hashes computed by the caller,
+    and a preprocess.Preprocessor to upload compact text instead of documents.
+
+    Returns a dict with "uploaded", "attached", "skipped" and "failed".
+    """
+    index = index or UploadIndex()
+    to_upload, to_attach, skipped = plan_uploads(
+        client, paths, vector_store_id, index, digests, preprocessor
+    )
+
+    def upload(path):
+        to_attach.append(upload_file(client, path, to_upload[path], index, preprocessor))
+
+    result = bulk.bulk_apply(list(to_upload), upload, workers=workers)
+    index.save()
+    if result.done:
+        cache.metadata.invalidate("files")
+
+    failed = dict(result.failed)
+    attached = []
+    if to_attach:
+        attach = attach_files(client, to_attach, vector_store_id, workers=workers)
+        attached = attach.done
+        failed.update(attach.failed)
+    return {
+        "uploaded": result.done,
+        "attached": attached,
+        "skipped": skipped,
+        "failed": failed,
+    }
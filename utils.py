@@ -1,8 +1,26 @@
+import hashlib
+import json
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import openai
+
+import answers
+import budget
+import bulk
+import cache
+import hedge
+import metrics
 import prints
+import retrieval
+import runs
+import sync
+import uploads
+from pagination import paginate
 
 
 # # Decorators
@@ -14,37 +32,53 @@ def print_created(f):
     return wrapper
 
 
-def timer(f):
-    def wrapper(*args, **kwargs):
-        start = time.time()
-        result = f(*args, **kwargs)
-        end = time.time()
-        print(f"{f.__name__} took {end - start} seconds.")
-        return result
-
-    return wrapper
-
-
 # # Fresh Start
-@timer
-def delete_all_messages(client, thread_id) -> None:
+def delete_all_messages(client, thread_id) -> bulk.BulkResult:
     print("Deleting all messages...\n")
-    messages = client.beta.threads.messages.list(thread_id=thread_id)
-    if not messages.data:
+    # Collect every page first: deleting while paging would invalidate the cursor
+    message_ids = [
+        message.id
+        for message in paginate(
+            client.beta.threads.messages.list, thread_id=thread_id, limit=100
+        )
+    ]
+    if not message_ids:
         print("No messages to delete.\n")
-        return
-    for message in messages.data:
-        client.beta.threads.messages.delete(thread_id=thread_id, message_id=message.id)
-        print(f"{message.id} - {message.role} message deleted.")
-    return None
+        return bulk.BulkResult()
+    result = bulk.bulk_delete(
+        message_ids,
+        lambda message_id: client.beta.threads.messages.delete(
+            thread_id=thread_id, message_id=message_id
+        ),
+    )
+    prints.print_bulk_result(result, "Messages deleted")
+    return result
 
 
-def cold_start(client, thread_id) -> None:
+def has_messages(client, thread_id) -> bool:
+    return bool(client.beta.threads.messages.list(thread_id=thread_id, limit=1).data)
+
+
+def cold_start(client, thread_id, rotator=None, fresh=False) -> str:
+    """Start the conversation from an empty thread and return its ID.
+
+    A fresh thread (created in this launch or without messages) is kept as
+    it is. With a ThreadRotator the thread is swapped for a pre-created empty
+    one, so the reset does not depend on how long the history is; otherwise
+    every message of the current thread is deleted.
+    """
+    if fresh:
+        print("Cold start! The thread is empty.\n")
+        return thread_id
+    if rotator is not None:
+        thread = rotator.rotate(thread_id)
+        print(f"Cold start! Thread rotated. ID: {thread.id}\n")
+        return thread.id
+
     delete_all_messages(client, thread_id)
-    time.sleep(1)
     print("Cold start!\n")
     prints.print_all_messages(client, thread_id)
-    return None
+    return thread_id
 
 
 # # Models
@@ -106,17 +140,41 @@ def update_env(
     return None
 
 
+def list_models(client) -> list:
+    return cache.metadata.list("models", client.models.list)
+
+
 def create_models_dict(sync_page) -> dict:
     def convert_unix_to_human_time(unix_time):
         return datetime.utcfromtimestamp(unix_time).strftime("%Y-%m-%d %H:%M:%S")
 
     model_dict = {}
-    for model in sync_page.data:
+    # Accept a page from client.models.list() or a plain list of models
+    for model in getattr(sync_page, "data", sync_page):
         human_time = convert_unix_to_human_time(model.created)
         model_dict[model.id] = human_time
     return model_dict
 
 
+def save_model_catalog(models: dict, path: str = ".models_cache.json") -> None:
+    with open(path, "w") as file:
+        json.dump({"fetched_at": time.time(), "models": models}, file, indent=2)
+
+
+def load_model_catalog(client, path: str = ".models_cache.json", ttl: float = 24 * 3600) -> dict:
+    """Model catalog from disk if it is younger than ttl, else from the API."""
+    try:
+        with open(path, "r") as file:
+            catalog = json.load(file)
+        if catalog["fetched_at"] + ttl > time.time():
+            return catalog["models"]
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    models = create_models_dict(list_models(client))
+    save_model_catalog(models, path)
+    return models
+
+
 def select_model(models: dict, default_model: str) -> str:
     while True:
         try:
@@ -172,6 +230,7 @@ def select_model(models: dict, default_model: str) -> str:
 
 # # Assistants
 def instructions_from_file(path: str = "instructions.txt") -> str:
+    instructions = None
     try:
         with open(path, "r") as file:
             instructions = file.read()
@@ -187,9 +246,10 @@ def create_assistant(client, instructions, name, model):
     assistant = client.beta.assistants.create(
         instructions=instructions,
         name=name,
-        tools=[{"type": "file_search"}],
+        tools=[retrieval.settings.file_search_tool()],
         model=model,
     )
+    cache.metadata.invalidate("assistants")
     return assistant
 
 
@@ -202,28 +262,38 @@ def retrieve_or_create_assistant(
             update_env(assistant_id=assistant.id)
             print(f'Assistant "{assistant.name}" retrieved. ID: {assistant.id}')
             break
-        except Exception:
+        except openai.NotFoundError:
             print("Assistant NOT found! You need to CREATE A NEW ASSISTANT.")
-            assistant_name = input("Enter assistant name: ").strip()
-            print(
-                "\nBefore proceeding, make sure that you've written your assistant's instructions "
-                'in "instructions.txt" and save this file.'
-            )
-            input('Press "Enter" to continue ...')
-
-            model: str = select_model(models, default_model)
-            print(model)
-            assistant = create_assistant(client, instructions, assistant_name, model)
-            print(f'Creating Assistant: "{assistant.name}" using {assistant.model} ...')
+            assistant = prompt_create_assistant(client, models, default_model, instructions)
             break
 
     return assistant
 
 
+def prompt_create_assistant(client, models, default_model, instructions):
+    assistant_name = input("Enter assistant name: ").strip()
+    if models is None:
+        models = load_model_catalog(client)
+    print(
+        "\nBefore proceeding, make sure that you've written your assistant's instructions "
+        'in "instructions.txt" and save this file.'
+    )
+    input('Press "Enter" to continue ...')
+
+    model: str = select_model(models, default_model)
+    print(model)
+    assistant = create_assistant(client, instructions, assistant_name, model)
+    print(f'Creating Assistant: "{assistant.name}" using {assistant.model} ...')
+    return assistant
+
+
 def update_assistant(client, assistant_id, vector_store_id, instructions, model):
     """
     Update the assistant's configuration with new instructions and model.
 
+    Only the fields that differ from the current assistant are sent, and
+    nothing is sent if it already matches.
+
     Parameters:
         client: The API client to interact with the service.
         assistant_id (str): The ID of the assistant to update.
@@ -242,27 +312,85 @@ def update_assistant(client, assistant_id, vector_store_id, instructions, model)
     if not isinstance(assistant_id, str) or not isinstance(vector_store_id, str):
         raise ValueError("assistant_id and vector_store_id must be strings.")
 
-    # Debugging: Print types of parameters
-    print(f"assistant_id type: {type(assistant_id)}")
-    print(f"vector_store_id type: {type(vector_store_id)}")
-    print(f"instructions type: {type(instructions)}")
-    print(f"model type: {type(model)}")
-
     try:
-        my_assistant = client.beta.assistants.update(
-            assistant_id,
-            instructions=instructions,
-            model=model,
-            tools=[{"type": "file_search"}],
-            tool_resources={"vector_store_ids": [vector_store_id]},  # Should be a list
+        assistant = client.beta.assistants.retrieve(assistant_id)
+        return reconcile_assistant(
+            client, assistant, vector_store_id, instructions=instructions, model=model
         )
-        return my_assistant
     except Exception as e:
-        # Log the error (logging setup not shown here)
         print(f"Error updating assistant: {e}")
         raise
 
 
+def _sha256(text: str | None) -> str | None:
+    return hashlib.sha256(text.encode()).hexdigest() if text is not None else None
+
+
+def _tool_key(tool: dict) -> tuple:
+    return tool["type"], (tool.get("file_search") or {}).get("max_num_results")
+
+
+def assistant_changes(assistant, desired: dict) -> dict:
+    """The fields of `desired` that differ from the assistant, as update kwargs."""
+    changes = {}
+    if "instructions" in desired and _sha256(desired["instructions"]) != _sha256(
+        assistant.instructions
+    ):
+        changes["instructions"] = desired["instructions"]
+    if "model" in desired and desired["model"] != assistant.model:
+        changes["model"] = desired["model"]
+    if "tools" in desired:
+        # Only compare what is set here; the API adds defaults of its own
+        current_tools = [_tool_key(tool.model_dump(exclude_none=True)) for tool in assistant.tools]
+        if current_tools != [_tool_key(tool) for tool in desired["tools"]]:
+            changes["tools"] = desired["tools"]
+    if "vector_store_ids" in desired:
+        file_search = assistant.tool_resources.file_search if assistant.tool_resources else None
+        current_ids = file_search.vector_store_ids if file_search else None
+        if (current_ids or []) != desired["vector_store_ids"]:
+            changes["tool_resources"] = {
+                "file_search": {"vector_store_ids": desired["vector_store_ids"]}
+            }
+    return changes
+
+
+def reconcile_assistant(
+    client,
+    assistant,
+    vector_store_id: str = None,
+    instructions_path: str = "instructions.txt",
+    instructions: str = None,
+    model: str = None,
+):
+    """Bring the assistant to the desired state with at most one update.
+
+    The desired state is the instructions (from `instructions` or the file),
+    the model (unchanged unless given), the file_search tool with the
+    vector store's max_num_results and, if given, the vector store. When
+    nothing differs no write is sent.
+    """
+    store_id = vector_store_id
+    if store_id is None and assistant.tool_resources and assistant.tool_resources.file_search:
+        store_id = (assistant.tool_resources.file_search.vector_store_ids or [None])[0]
+    desired = {"tools": [retrieval.settings.file_search_tool(store_id)]}
+    if instructions is None and os.path.exists(instructions_path):
+        instructions = instructions_from_file(instructions_path)
+    if instructions is not None:
+        desired["instructions"] = instructions
+    if model is not None:
+        desired["model"] = model
+    if vector_store_id is not None:
+        desired["vector_store_ids"] = [vector_store_id]
+
+    changes = assistant_changes(assistant, desired)
+    if not changes:
+        return assistant
+    assistant = client.beta.assistants.update(assistant.id, **changes)
+    cache.metadata.invalidate("assistants")
+    print(f"Assistant updated: {', '.join(changes)}")
+    return assistant
+
+
 # # Threads
 def create_thread(client):
     thread = client.beta.threads.create()
@@ -276,17 +404,89 @@ def retrieve_or_create_thread(client, thread_id: str):
             thread = client.beta.threads.retrieve(thread_id)
             print(f"Thread retrieved. ID: {thread.id}")
             break
-        except Exception:
+        except openai.NotFoundError:
             print("Thread NOT found! Creating a NEW THREAD.")
             thread = create_thread(client)
             break
     return thread
 
 
+class ThreadRotator:
+    """Keep a small pool of empty threads to swap in on a cold start.
+
+    Spare threads are created and old threads deleted on a background worker,
+    so rotate() only has to update THREAD_ID in the environment file.
+    on_retire(thread_id) is called for every thread rotated away, e.g. to
+    forget its token usage.
+    """
+
+    def __init__(
+        self,
+        client,
+        size: int = 2,
+        env_path: str = ".env",
+        prefill: bool = True,
+        on_retire=None,
+    ) -> None:
+        self.client = client
+        self.size = size
+        self.env_path = env_path
+        self.on_retire = on_retire
+        self._spares = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        # Without prefill the first rotation creates its thread and fills the pool
+        if prefill:
+            self.refill()
+
+    def refill(self) -> None:
+        with self._lock:
+            missing = self.size - self._spares.qsize() - self._pending
+            self._pending += max(missing, 0)
+        for _ in range(missing):
+            self._executor.submit(self._create_spare)
+
+    def _create_spare(self) -> None:
+        try:
+            self._spares.put(self.client.beta.threads.create())
+        except Exception as e:
+            print(f"\nCould not create a spare thread: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _delete(self, thread_id: str) -> None:
+        try:
+            self.client.beta.threads.delete(thread_id)
+        except Exception as e:
+            print(f"\nCould not delete thread {thread_id}: {str(e)}")
+
+    def rotate(self, old_thread_id: str):
+        try:
+            thread = self._spares.get_nowait()
+        except queue.Empty:
+            thread = self.client.beta.threads.create()
+        update_env(path=self.env_path, thread_id=thread.id)
+        if old_thread_id:
+            self._executor.submit(self._delete, old_thread_id)
+            if self.on_retire is not None:
+                self.on_retire(old_thread_id)
+        self.refill()
+        return thread
+
+    def close(self) -> None:
+        """Delete unused spare threads and wait for background work."""
+        self._executor.shutdown(wait=True)
+        while not self._spares.empty():
+            self._delete(self._spares.get_nowait().id)
+
+
 # # Vector Stores
 def create_vector_store(client):
     name = input("Enter a name for the Vector Store: ").strip()
     vector_store = client.beta.vector_stores.create(name=name)
+    cache.metadata.invalidate("vector_stores")
     return vector_store
 
 
@@ -298,43 +498,48 @@ def retrieve_or_create_vector_store(client, vector_store_id):
                 f'Vector Store "{vector_store.name}" retrieved. ID: {vector_store.id}'
             )
             break
-        except Exception:
+        except openai.NotFoundError:
             print("Vector Store NOT found!\nCreating a NEW VECTOR STORE.")
             vector_store = create_vector_store(client)
             break
     return vector_store
 
 
-def delete_vector_store_s(client, vector_stores_list: list) -> None:
-    for vs in vector_stores_list:
-        deleted_vector_store = client.beta.vector_stores.delete(vector_store_id=vs)
-        print(f"{deleted_vector_store} deleted.")
-    return None
+def delete_vector_store_s(client, vector_stores_list: list) -> bulk.BulkResult:
+    result = bulk.bulk_delete(
+        vector_stores_list,
+        lambda vs: client.beta.vector_stores.delete(vector_store_id=vs),
+    )
+    cache.metadata.invalidate("vector_stores")
+    prints.print_bulk_result(result, "Vector stores deleted")
+    return result
 
 
-def delete_all_vector_stores(client) -> None:
-    vector_stores = client.beta.vector_stores.list()
-    for vector_store in vector_stores.data:
-        deleted_vector_store = client.beta.vector_stores.delete(vector_store.id)
-        print(f"{deleted_vector_store} deleted.")
+def delete_all_vector_stores(client) -> bulk.BulkResult:
+    vector_store_ids = [vs.id for vs in paginate(client.beta.vector_stores.list, limit=100)]
+    result = delete_vector_store_s(client, vector_store_ids)
     print("All vector stores deleted.")
-    return None
+    return result
 
 
 # # Messages
 def create_message(client, content, thread_id):
-    client.beta.threads.messages.create(
+    message = client.beta.threads.messages.create(
         thread_id=thread_id,
         role="user",
         content=content,
     )
+    return message
 
 
 # # Runs
-def create_run(client, assistant_id, thread_id):
-    run = client.beta.threads.runs.create(
-        thread_id=thread_id, assistant_id=assistant_id, tools=[{"type": "file_search"}]
-    )
+def create_run(client, assistant_id, thread_id, additional_messages=None, run_options=None):
+    # The user message can ride along with the run instead of costing a call
+    extra = dict(run_options or {})
+    if additional_messages:
+        extra["additional_messages"] = additional_messages
+    # Without tools in run_options the run uses the assistant's file_search settings
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id, **extra)
 
     return run
 
@@ -344,15 +549,22 @@ def upload_file(client, path, purpose="assistants"):
     try:
         with open(path, "rb") as file:
             client.files.create(file=file, purpose=purpose)
+        cache.metadata.invalidate("files")
     except Exception as e:
         print(f"An error occurred: {e}")
         pass
 
 
-def upload_file_batch(client, vector_store):
-    # Ready the files for upload to OpenAI
+def upload_file_batch(client, vector_store, index=None, ingest_queue=None, preprocessor=None):
+    """Ask for files and folders to upload to the vector store.
 
-    file_paths = []
+    With an ingestion queue the uploads and indexing run in the background
+    and this returns as soon as the user is done choosing; the queue's
+    preprocessor is used then.
+    """
+    # Ready the files for upload to OpenAI
+    prints.print_files_and_folders(prints.list_user_files(), prints.list_user_folders())
+    index = index or (ingest_queue.index if ingest_queue is not None else uploads.UploadIndex())
     while True:
         file_path = input(
             "If you want to upload individual files, enter the file name including the extension: \n"
@@ -361,28 +573,120 @@ def upload_file_batch(client, vector_store):
         )
         if file_path.lower() in [""]:
             return
-        else:
-            try:
-                file_paths.append(file_path)
-            except Exception as e:
-                print(f"Error: {str(e)}\n")
-                continue
+        if os.path.isdir(file_path):
+            sync_folder(
+                client,
+                vector_store,
+                file_path,
+                index=index,
+                ingest_queue=ingest_queue,
+                preprocessor=preprocessor,
+            )
+            continue
+        if ingest_queue is not None:
+            if os.path.isfile(file_path):
+                ingest_queue.submit([file_path])
+                print(f"{file_path} queued for upload.")
             else:
-                file_streams = [open(path, "rb") for path in file_paths]
-                file_batch = client.beta.vector_stores.file_batches.upload_and_poll(
-                    vector_store_id=vector_store.id, files=file_streams
-                )
-        print(file_batch.file_counts)
-    return file_batch
+                print(f"Error: {file_path} not found.\n")
+            continue
+        try:
+            result = uploads.upload_new_files(
+                client, [file_path], vector_store.id, index, preprocessor=preprocessor
+            )
+        except Exception as e:
+            print(f"Error: {str(e)}\n")
+            continue
+        prints.print_upload_result(result)
+        if preprocessor is not None:
+            prints.print_preprocess_reports(preprocessor.take_reports())
+
+
+def sync_folder(
+    client,
+    vector_store,
+    folder: str,
+    confirm: bool = True,
+    index=None,
+    ingest_queue=None,
+    preprocessor=None,
+) -> None:
+    """Mirror a local folder in the vector store.
 
+    Uploads new and changed files and detaches the ones deleted locally. With
+    an ingestion queue the uploads are queued, and the old versions are only
+    detached and the sync state saved once the new ones are indexed.
+    """
+    state = sync.SyncState()
+    plan = sync.plan_sync(client, folder, vector_store.id, state)
+    prints.print_sync_plan(plan)
+    if plan.is_empty():
+        return None
+    if confirm and input("Apply these changes? [y/N]: ").strip().lower() not in ["y", "yes"]:
+        print("Sync cancelled.")
+        return None
+
+    index = index or (ingest_queue.index if ingest_queue is not None else uploads.UploadIndex())
+    if ingest_queue is not None:
+        preprocessor = ingest_queue.preprocessor
+    changed = {os.path.join(folder, path): path for path in plan.add + plan.update}
+    digests = {path: plan.entries[rel]["sha256"] for path, rel in changed.items()}
+
+    if ingest_queue is not None and changed:
+        # Progress is shown by the chat status line, not printed over the prompt
+        ingest_queue.submit(
+            list(changed),
+            digests,
+            on_done=lambda result: _finish_sync(
+                client, vector_store.id, folder, plan, state, index, preprocessor, quiet=True
+            ),
+        )
+        print(f"{len(changed)} files queued for upload.")
+        return None
+    result = uploads.upload_new_files(
+        client, list(changed), vector_store.id, index, digests=digests, preprocessor=preprocessor
+    )
+    prints.print_upload_result(result)
+    if preprocessor is not None:
+        prints.print_preprocess_reports(preprocessor.take_reports())
+    _finish_sync(client, vector_store.id, folder, plan, state, index, preprocessor)
+    return None
 
-def delete_files(client, files_list: list[str]) -> None:
+
+def _finish_sync(
+    client, vector_store_id, folder, plan, state, index, preprocessor=None, quiet=False
+) -> None:
+    for relative_path, entry in plan.entries.items():
+        path = os.path.join(folder, relative_path)
+        indexed = index.get(uploads.index_key(entry["sha256"], path, preprocessor))
+        if indexed is not None:
+            entry["file_id"] = indexed["file_id"]
+    previous = state.get(vector_store_id, folder)
+    for relative_path, old_id in plan.remove.items():
+        entry = plan.entries.get(relative_path)
+        if entry is not None and entry["file_id"] is None:
+            # The new version failed to upload: keep the old one until the next sync
+            plan.entries[relative_path] = previous[relative_path]
+    current_ids = {entry["file_id"] for entry in plan.entries.values()}
+    stale_ids = [file_id for file_id in plan.remove.values() if file_id not in current_ids]
+    if stale_ids:
+        delete_from_vs(client, stale_ids, vector_store_id, quiet=quiet)
+
+    state.set(vector_store_id, folder, plan.entries)
+    state.save()
+
+
+def delete_files(client, files_list: list[str]) -> bulk.BulkResult:
     """Delete all files in the list."""
-    for file_id in files_list:
-        deleted_file = client.files.delete(file_id)
-        print(f"{deleted_file} deleted.")
-    print("All files deleted.")
-    return None
+    result = bulk.bulk_delete(files_list, client.files.delete)
+    # Deleted files also leave every vector store they were attached to
+    cache.metadata.invalidate("files", "vector_stores")
+    index = uploads.UploadIndex()
+    for file_id in result.done:
+        index.remove_file_id(file_id)
+    index.save()
+    prints.print_bulk_result(result, "Files deleted")
+    return result
 
 
 def manage_files(client, vector_store, choice=None) -> None:
@@ -391,28 +695,49 @@ def manage_files(client, vector_store, choice=None) -> None:
 
 
 # # Vector Store Files
-def add_to_vs(client, files_list: list[str], vector_store_id: str) -> None:
-    for file_id in files_list:
-        vector_store_file = client.beta.vector_stores.files.create(
-            vector_store_id=vector_store_id,
-            file_id=file_id,
-        )
-        print(f"ID: {vector_store_file.id} added to {vector_store_id}.")
-    return None
+def add_to_vs(
+    client, files_list: list[str], vector_store_id: str, chunk_size: int = 500, workers: int = 4
+) -> bulk.BulkResult:
+    """Attach files to a vector store (see uploads.attach_files), showing progress."""
+    finished = []
+
+    def progress(file_ids):
+        finished.extend(file_ids)
+        prints.print_progress("Attaching", len(finished), len(files_list))
+
+    result = uploads.attach_files(
+        client, files_list, vector_store_id, chunk_size, workers, on_done=progress
+    )
+    prints.print_bulk_result(result, f"Files attached to {vector_store_id}")
+    return result
 
 
-def delete_from_vs(client, files_list, vector_store_id):
-    for file_id in files_list:
-        print(f"\n \n file_id: {len(file_id)}, vector_store_id: {len(vector_store_id)}")
-        print(f"\n \n file_id: {file_id}, vector_store_id: {vector_store_id}")
+def delete_from_vs(
+    client, files_list: list[str], vector_store_id: str, workers: int = 8, quiet: bool = False
+) -> bulk.BulkResult:
+    """Detach files from a vector store, at most `workers` at a time.
 
-        deleted_file = client.beta.vector_stores.files.delete(vector_store_id, file_id)
-        print(f"{deleted_file} deleted from {vector_store_id}.")
-    print("All vector store files deleted.")
-    return None
+    With quiet nothing is printed, e.g. from a background thread.
+    """
+    finished = []
+
+    def progress(file_id, error):
+        finished.append(file_id)
+        prints.print_progress("Detaching", len(finished), len(files_list))
+
+    result = bulk.bulk_delete(
+        files_list,
+        lambda file_id: client.beta.vector_stores.files.delete(file_id, vector_store_id=vector_store_id),
+        workers=workers,
+        on_done=None if quiet else progress,
+    )
+    cache.metadata.invalidate("vector_stores")
+    if not quiet:
+        prints.print_bulk_result(result, f"Files detached from {vector_store_id}")
+    return result
 
 
-def manage_vector_stores(client, vector_store, choice=None) -> None:
+def manage_vector_stores(client, vector_store, choice=None, preprocessor=None) -> None:
     def get_choice(prompt):
         """Helper function to get user input with error handling."""
         try:
@@ -431,6 +756,7 @@ def manage_vector_stores(client, vector_store, choice=None) -> None:
                     + "[C]reate a new vector store\n"
                     + "[D]elete current vector store\n"
                     + "[L]ist existing vector stores\n"
+                    + "[S]ync a folder into the current vector store\n"
                     + "[Q]uit\n\n"
                 )
         except Exception as e:
@@ -459,12 +785,11 @@ def manage_vector_stores(client, vector_store, choice=None) -> None:
         # Delete the current vector store
         elif choice.lower() in ["d", "delete"]:
             if vector_store:
-                try:
-                    delete_vector_store_s(client, [vector_store.id])
+                result = delete_vector_store_s(client, [vector_store.id])
+                if not result.failed:
                     update_env(vector_store_id="")
                     print("Vector store deleted.")
-                except Exception as e:
-                    print(f"Error: {str(e)}")
+                else:
                     print(
                         "No vector store found to delete. Please create a new vector store or select an existing one."
                     )
@@ -475,6 +800,17 @@ def manage_vector_stores(client, vector_store, choice=None) -> None:
             choice = None
             continue
 
+        # Sync a local folder into the current vector store
+        elif choice.lower() in ["s", "sync"]:
+            prints.print_files_and_folders([], prints.list_user_folders())
+            folder = get_choice("Enter the folder name to sync: ").strip()
+            if os.path.isdir(folder):
+                sync_folder(client, vector_store, folder, preprocessor=preprocessor)
+            else:
+                print(f'\n"{folder}" is not a folder.')
+            choice = None
+            continue
+
         # List existing vector stores
         elif choice.lower() in ["l", "list"]:
             prints.list_vs_n_files(client, vector_stores=None)
@@ -504,8 +840,312 @@ def manage_vector_stores(client, vector_store, choice=None) -> None:
             choice = None
 
 
-def chat(client, assistant_id: str, thread_id: str) -> None:
+def message_text(message) -> str:
+    return "\n".join(
+        content.text.value for content in message.content if content.type == "text"
+    )
+
+
+def stream_run(
+    client,
+    assistant_id: str,
+    thread_id: str,
+    timeout=None,
+    after=None,
+    additional_messages=None,
+    run_options=None,
+):
+    """Create a run and print its text deltas as they arrive.
+
+    Returns the final run, the time-to-first-token in seconds (None if no text
+    was streamed) and the last assistant message (None if there was none).
+    The answer comes from the stream itself, so with additional_messages the
+    whole turn is a single request. run_options (e.g. token limits) are sent
+    with the run. Falls back to polling if the stream breaks; only the part
+    of the answer not streamed yet is printed then. A run still going when
+    `timeout` runs out is cancelled, as a polled one would be.
+    """
+    extra = dict(run_options or {})
+    if additional_messages:
+        extra["additional_messages"] = additional_messages
+    deadline = None
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+        # A stream silent for the whole turn fails over to polling, which cancels
+        extra["timeout"] = timeout
+    start = time.perf_counter()
+    first_token = None
+    streamed = []
+    stream = None
+    # The run is created once the stream is open; the rest is waiting on it
+    create_span = metrics.span("run create")
+    try:
+        with client.beta.threads.runs.stream(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            **extra,
+        ) as stream:
+            create_span.finish()
+            with metrics.span("run wait", streamed=True):
+                timed_out = False
+                for event in stream:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        timed_out = True
+                        break
+                    if event.event != "thread.message.delta":
+                        continue
+                    for content in event.data.delta.content or []:
+                        if content.type != "text" or not content.text or not content.text.value:
+                            continue
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                            print("Assistant: ", end="", flush=True)
+                        print(content.text.value, end="", flush=True)
+                        streamed.append(content.text.value)
+                if first_token is not None:
+                    print()
+                if timed_out:
+                    # The deadline has passed, so the waiter cancels the run at once
+                    run = runs.wait_for_run(
+                        client, stream.current_run, 0, on_status=prints.print_run_status
+                    )
+                else:
+                    run = stream.get_final_run()
+                message = stream.current_message_snapshot
+    except Exception as e:
+        create_span.finish()
+        print(f"\nStreaming failed ({str(e)}), falling back to polling.")
+        # Keep waiting on the run the stream already created, if any
+        run = stream.current_run if stream is not None else None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+        run, message = poll_run(
+            client,
+            assistant_id,
+            thread_id,
+            run,
+            timeout,
+            after,
+            additional_messages,
+            run_options,
+            streamed="".join(streamed),
+        )
+        return run, None, message
+
+    if run.status != "completed":
+        prints.print_run_error(run)
+    return run, first_token, message
+
+
+def poll_run(
+    client,
+    assistant_id: str,
+    thread_id: str,
+    run=None,
+    timeout=None,
+    after=None,
+    additional_messages=None,
+    run_options=None,
+    streamed: str = "",
+):
+    """Wait for the run, then fetch only its messages newer than `after`.
+
+    `streamed` is answer text already printed from a stream that broke.
+    Returns the run and its last assistant message (None if there was none).
+    """
+    if run is None:
+        with metrics.span("run create"):
+            run = create_run(client, assistant_id, thread_id, additional_messages, run_options)
+    with metrics.span("run wait"):
+        run = runs.wait_for_run(client, run, timeout, on_status=prints.print_run_status)
+
+    if run.status != "completed":
+        prints.print_run_error(run)
+        return run, None
+    with metrics.span("response fetch"):
+        return run, prints.print_response(client, thread_id, run.id, after, streamed)
+
+
+def cached_turn(client, thread_id: str, question: str, answer: str):
+    """Record a cached answer in the thread without running the assistant."""
+    create_message(client, question, thread_id)
+    return client.beta.threads.messages.create(
+        thread_id=thread_id, role="assistant", content=answer
+    )
+
+
+def chat_turn(
+    client,
+    assistant_id: str,
+    thread_id: str,
+    text: str,
+    stream: bool = True,
+    timeout: float = 120.0,
+    answer_cache=None,
+    fold: bool = True,
+    hedge_tracker: hedge.HedgeTracker = None,
+    token_budget: budget.TokenBudget = None,
+    run_options: dict = None,
+) -> str | None:
+    """Answer one question; returns the ID of the last message seen.
+
+    With fold the user message is sent with the run instead of in its own
+    call; streamed, the turn then takes a single request. With a hedge
+    tracker the run is polled and hedged when slow (see hedge.hedged_run).
+    With a token budget its limits are sent with the run and the run's usage
+    is added to the thread's total. run_options (e.g. file_search tools) are
+    sent with every run.
+    The turn is traced as a "chat turn" span with a child span per step.
+    """
+    with metrics.span("chat turn", streamed=stream, folded=fold) as turn:
+        last_message_id = _chat_turn(
+            client,
+            assistant_id,
+            thread_id,
+            text,
+            stream,
+            timeout,
+            answer_cache,
+            fold,
+            hedge_tracker,
+            token_budget,
+            run_options,
+            turn,
+        )
+    prints.print_trace(turn)
+    return last_message_id
+
+
+def _chat_turn(
+    client,
+    assistant_id,
+    thread_id,
+    text,
+    stream,
+    timeout,
+    answer_cache,
+    fold,
+    hedge_tracker,
+    token_budget,
+    run_options,
+    turn,
+):
+    start = time.perf_counter()
+    first_token = None
+
+    context = None
+    if answer_cache is not None:
+        try:
+            context = answers.current_context(client, assistant_id)
+        except Exception as e:
+            print(f"Answer cache skipped: {str(e)}")
+    if context is not None:
+        answer = answer_cache.get(text, context)
+        if answer is not None:
+            print(f"Assistant: {answer}")
+            turn.attributes["cached"] = True
+            with metrics.span("message create"):
+                message = cached_turn(client, thread_id, text, answer)
+            prints.print_turn_latency(
+                None, time.perf_counter() - start, cached=True, calls=turn.call_count()
+            )
+            return message.id
+
+    additional_messages = None
+    last_message_id = None
+    if fold:
+        additional_messages = [{"role": "user", "content": text}]
+    else:
+        with metrics.span("message create"):
+            last_message_id = create_message(client, text, thread_id).id
+
+    run_options = dict(run_options or {})
+    if token_budget is not None:
+        run_options.update(token_budget.run_options())
+    if hedge_tracker is not None:
+        with metrics.span("run create"):
+            run = create_run(client, assistant_id, thread_id, additional_messages, run_options)
+        run, message = hedge.hedged_run(
+            client, assistant_id, thread_id, hedge_tracker, run, timeout, run_options
+        )
+    elif stream:
+        run, first_token, message = stream_run(
+            client,
+            assistant_id,
+            thread_id,
+            timeout,
+            last_message_id,
+            additional_messages,
+            run_options,
+        )
+    else:
+        run, message = poll_run(
+            client,
+            assistant_id,
+            thread_id,
+            timeout=timeout,
+            after=last_message_id,
+            additional_messages=additional_messages,
+            run_options=run_options,
+        )
+
+    turn.attributes["status"] = run.status
+    thread_tokens = None
+    if token_budget is not None:
+        thread_tokens = token_budget.record(thread_id, run.usage)["total_tokens"]
+    if message is not None:
+        last_message_id = message.id
+        if context is not None and run.status == "completed":
+            answer_cache.put(text, context, message_text(message))
+
+    prints.print_turn_latency(
+        first_token,
+        time.perf_counter() - start,
+        calls=turn.call_count(),
+        usage=run.usage,
+        thread_tokens=thread_tokens,
+    )
+
+    # print_run_steps(thread_id, run.id)
+    return last_message_id
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def chat(
+    client,
+    assistant_id: str,
+    thread_id: str,
+    stream: bool = True,
+    timeout: float = 120.0,
+    answer_cache=None,
+    instructions_path: str = "instructions.txt",
+    fold: bool = True,
+    hedge_tracker: hedge.HedgeTracker = None,
+    token_budget: budget.TokenBudget = None,
+    rotator: ThreadRotator = None,
+    ingest_queue=None,
+    run_options: dict = None,
+) -> None:
+    """Chat until the user quits.
+
+    When the thread goes over the token budget the user is warned once, or
+    with the "rotate" action the conversation moves on to a fresh thread.
+    With an ingestion queue its progress is shown before each prompt while
+    it changes; files are searchable as soon as their batch is indexed.
+    """
+    instructions_mtime = None
+    warned = set()
+    ingest_status = None
     while True:
+        if ingest_queue is not None and ingest_queue.status() != ingest_status:
+            ingest_status = ingest_queue.status()
+            prints.print_ingest_status(ingest_status)
         text = input("\nUser: ")
         if text.lower() in ["exit", "quit", "q", "bye"]:
             print("Sorry to see you go!")
@@ -513,17 +1153,50 @@ def chat(client, assistant_id: str, thread_id: str) -> None:
         else:
             pass
 
-        create_message(client, text, thread_id)
-
-        run = create_run(client, assistant_id, thread_id)
-        while not run.completed_at:
-            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
-            print(run.status)
-            # time.sleep(1)
-
-        prints.print_response(client, thread_id)
+        try:
+            # Pick up edits to the instructions file between turns
+            mtime = _mtime(instructions_path)
+            if mtime != instructions_mtime:
+                assistant = cache.metadata.get_or_load(
+                    "assistants",
+                    assistant_id,
+                    lambda: client.beta.assistants.retrieve(assistant_id),
+                )
+                reconcile_assistant(client, assistant, instructions_path=instructions_path)
+                instructions_mtime = mtime
+
+            chat_turn(
+                client,
+                assistant_id,
+                thread_id,
+                text,
+                stream,
+                timeout,
+                answer_cache,
+                fold,
+                hedge_tracker,
+                token_budget,
+                run_options,
+            )
+        except openai.APIError as e:
+            print(f"Error: {str(e)}")
 
-        # print_run_steps(thread_id, run.id)
+        if token_budget is not None and token_budget.exceeded(thread_id):
+            used = token_budget.total(thread_id)
+            if token_budget.action == "rotate":
+                if rotator is None:
+                    rotator = ThreadRotator(client, size=0, on_retire=token_budget.forget)
+                thread_id = rotator.rotate(thread_id).id
+                prints.print_budget_rotated(used, token_budget.thread_budget, thread_id)
+            elif thread_id not in warned:
+                warned.add(thread_id)
+                prints.print_budget_warning(used, token_budget.thread_budget)
+        metrics.registry.export()
+
+    if answer_cache is not None:
+        prints.print_answer_cache_stats(answer_cache)
+    if hedge_tracker is not None:
+        prints.print_hedge_stats(hedge_tracker)
 
 
 # utils.print_all_messages(thread_id)